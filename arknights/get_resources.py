@@ -5,13 +5,11 @@ from collections import defaultdict
 from pathlib import Path
 from typing import Dict, List, Tuple
 
-import requests
-from omegaconf import OmegaConf
-
+from utils.index_utils import StemIndex
 from utils.json_utils import read_json
 from utils.models import Character, FilterGroup
 from utils.resource_utils import ResourceProcessor
-from utils.web_utils import download_json
+from utils.web_utils import download_json_all, download_stats
 
 use_local_tables = False
 script_dir = Path(__file__).parent
@@ -42,6 +40,8 @@ def get_github_versions() -> dict[str, str]:
         "KR": "ko",
         "EN": "us",
     }
+    import requests
+
     result = {}
     commits = (
         requests.get(f"https://api.github.com/repos/{github_repo_intl}/commits").json() +
@@ -76,6 +76,7 @@ class ArknightsResourceProcessor(ResourceProcessor):
         # download data
         char_tables = {}
         enemy_tables = {}
+        downloads = []
         for lang in langs:
             for tables, name in [
                 [char_tables, "character_table.json"],
@@ -89,17 +90,23 @@ class ArknightsResourceProcessor(ResourceProcessor):
                 local_file = res_root / f"{res_keys[lang]}/assets/gamedata/excel/{name}"
                 if use_local_tables and os.path.isfile(local_file):
                     logging.info(f"Read {lang} table {name}")
-                    table = read_json(local_file, None)
+                    tables[lang] = read_json(local_file, None)
                 else:
                     logging.info(f"Download {lang} table {name}")
                     github_repo = github_repo_cn if lang == "zh-cn" else github_repo_intl
                     github_branch = "master" if lang == "zh-cn" else "main"
                     url = f"https://github.com/{github_repo}/blob/{github_branch}/{lang_keys[lang]}/gamedata/excel/{name}?raw=true"
-                    table = download_json(url)
+                    downloads.append((tables, lang, url))
+
+        results = download_json_all([url for _, _, url in downloads], Path(self.args.cache) / "http")
+        logging.info(f"Downloaded {download_stats}")
+        for (tables, lang, _), table in zip(downloads, results):
+            tables[lang] = table
 
+        for tables in [char_tables, enemy_tables]:
+            for lang, table in tables.items():
                 if "enemyData" in table:
-                    table = table["enemyData"]
-                tables[lang] = table
+                    tables[lang] = table["enemyData"]
 
         # get all avatars from cn
         res_root = res_root / "cn/assets"
@@ -110,16 +117,23 @@ class ArknightsResourceProcessor(ResourceProcessor):
         appellations = defaultdict(str)
         ch_types = set()
 
-        sprite_folders = sorted(res_root.glob("spritepack/ui_char_avatar_*"))
         sprite_files: list[Path] = []
-        for folder in sprite_folders:
+        for folder in sorted(res_root.glob("spritepack/ui_char_avatar_*")):
             sprite_files += sorted(folder.glob("*.png"))
         print(f"Found {len(sprite_files)} character sprite files")
 
+        enemy_sprite_files: list[Path] = []
+        for folder in sorted(res_root.glob("spritepack/icon_enemies_*")):
+            enemy_sprite_files += sorted(folder.glob("*.png"))
+        print(f"Found {len(enemy_sprite_files)} enemy sprite files")
+
+        # character and enemy ids don't share prefixes, so one index serves both
+        sprite_index = StemIndex(sprite_files + enemy_sprite_files)
+
         for k, v in sorted(char_tables["zh-cn"].items(), key=lambda pair: pair[0]):
             name = v["name"]
 
-            basic_sprite = next(iter(f for f in sprite_files if f.stem == k), None)
+            basic_sprite = sprite_index.find(k)
             if basic_sprite is None:
                 logging.warning(f"Skip: {k} {name}")
                 continue
@@ -139,31 +153,27 @@ class ArknightsResourceProcessor(ResourceProcessor):
                 img_name = os.path.splitext(os.path.split(file)[1])[0]
                 avatar_files[img_name] = file
                 ch.images.append(img_name)
-            for file in (f for f in sprite_files if f.stem.startswith(k) and f.stem != k):
-                add_sprite_file(file)
+            for file in sprite_index.with_prefix(k):
+                if file.stem != k:
+                    add_sprite_file(file)
 
             # special handle: amiya
             if k == "char_002_amiya":
                 alts = ["char_1001_amiya2", "char_1037_amiya3", "npc_1295_amiya"]
-                for file in (f for f in sprite_files if any(f.stem.startswith(alt) and f.stem != alt for alt in alts)):
-                    add_sprite_file(file)
+                for file in sprite_index.with_prefixes(alts):
+                    if file.stem not in alts:
+                        add_sprite_file(file)
 
             characters.append(ch)
 
         logging.info(f"All ch types: {ch_types}")
 
-        sprite_folders = sorted(res_root.glob("spritepack/icon_enemies_*"))
-        sprite_files: list[Path] = []
-        for folder in sprite_folders:
-            sprite_files += sorted(folder.glob("*.png"))
-        print(f"Found {len(sprite_files)} enemy sprite files")
-
         for k, v in sorted(enemy_tables["zh-cn"].items(), key=lambda pair: pair[0]):
             name = v["name"]
             if name == "-":
                 continue
 
-            basic_sprite = next(iter(f for f in sprite_files if f.stem == k), None)
+            basic_sprite = sprite_index.find(k)
             if basic_sprite is None:
                 logging.warning(f"Skip: {k} {name}")
                 continue
@@ -210,6 +220,8 @@ class ArknightsResourceProcessor(ResourceProcessor):
         return []
 
     def get_filters(self) -> List[FilterGroup]:
+        from omegaconf import OmegaConf
+
         translations = OmegaConf.to_container(OmegaConf.load(script_dir / "lang/filters.yaml"))
         type_filter = FilterGroup(
             "type",
@@ -222,6 +234,9 @@ class ArknightsResourceProcessor(ResourceProcessor):
         )
         return [type_filter]
 
+    def get_stage_configs(self) -> Dict[str, List[Path]]:
+        return {"filters": [script_dir / "lang/filters.yaml"]}
+
     def _get_versions(self) -> Dict[str, str]:
         versions = super()._get_versions() if use_local_tables else {}
         versions.update(self.github_res_vers)
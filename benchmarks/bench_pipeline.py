@@ -0,0 +1,205 @@
+"""
+Benchmarks for the resource build pipeline on a synthetic Astgenne tree.
+
+    source init.source
+    python benchmarks/bench_pipeline.py --chars 300 --enemies 200 -o bench.json
+
+Each stage is timed separately and the results are written as JSON, so runs can be compared.
+"""
+import logging
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from omegaconf import OmegaConf
+from PIL import Image
+
+import arknights.get_resources as ak
+from blue_archive.get_resources_v3 import BlueArchiveResourceProcessor
+from utils.image_utils import process_image, scale_and_crop
+from utils.json_utils import write_json, write_list
+from utils.models import Character, FilterGroup
+
+resource_project_folder = Path(__file__).parent.parent
+
+
+def make_image(file: Path, size: int, aspect: float, rng: random.Random):
+    file.parent.mkdir(parents=True, exist_ok=True)
+    w, h = (size, int(size * aspect)) if aspect >= 1 else (int(size / aspect), size)
+    # Noise compresses and resizes like real art, a flat color would not
+    img = Image.frombytes("RGBA", (w, h), rng.randbytes(w * h * 4))
+    img.save(file)
+
+
+def make_ak_fixture(root: Path, args, rng: random.Random):
+    assets = root / "ak/cn/assets"
+    char_table = {}
+    for i in range(args.chars):
+        k = f"char_{i:03d}_op{i}"
+        char_table[k] = {"name": f"干员{i}", "appellation": f"Operator{i}"}
+        folder = assets / f"spritepack/ui_char_avatar_{i % 4}"
+        make_image(folder / f"{k}.png", args.size, rng.choice(args.aspect), rng)
+        for skin in range(args.skins):
+            make_image(folder / f"{k}_{skin + 2}.png", args.size, rng.choice(args.aspect), rng)
+
+    enemy_table = {}
+    for i in range(args.enemies):
+        k = f"enemy_{1000 + i}_e{i}"
+        enemy_table[k] = {"name": f"敌人{i}"}
+        make_image(assets / f"spritepack/icon_enemies_{i % 2}/{k}.png", args.size, 1.0, rng)
+
+    # Closure is always added
+    make_image(assets / "spritepack/ui_char_avatar_h1_0/char_007_closre_1.png", args.size, 1.0, rng)
+
+    for lang, res_key in ak.res_keys.items():
+        excel = root / f"ak/{res_key}/assets/gamedata/excel"
+        write_json(excel / "character_table.json", char_table)
+        write_json(excel / "enemy_handbook_table.json", {"enemyData": enemy_table})
+
+
+def make_ba_fixture(root: Path, args, rng: random.Random):
+    assets = root / "ba/assets"
+    chars = OmegaConf.load(resource_project_folder / "blue_archive/data/chars.yaml")
+    paths = ["UIs/01_Common/01_Character/Student_Portrait_Serika_Shibasek"]
+    paths += [img.split(":")[-1] for data in chars.values() for img in data.image_files]
+    for path in paths:
+        make_image(assets / f"{path}.png", args.size, rng.choice(args.aspect), rng)
+
+    for i in range(args.stamps):
+        make_image(assets / f"UIs/01_Common/31_ClanEmoji/ClanChat_Emoji_{i}_Jp.png", args.size, 1.0, rng)
+
+
+def make_fixture(root: Path, args):
+    rng = random.Random(args.seed)
+    make_ak_fixture(root, args, rng)
+    make_ba_fixture(root, args, rng)
+    write_json(root / "versions.json", {"ak": {"cn": "bench"}, "ba": {"jp": "bench"}})
+
+
+def create_processor(cls: Callable[[], Any], astgenne: Path, output: Path, args):
+    argv = sys.argv
+    sys.argv = [argv[0], "-a", str(astgenne), "-o", str(output), "--cache", str(output / ".cache"), "-j", str(args.jobs)]
+    try:
+        return cls()
+    finally:
+        sys.argv = argv
+
+
+def create_ak_processor(astgenne: Path, output: Path, args):
+    # Read the fixture tables instead of downloading
+    ak.use_local_tables = True
+    ak.get_github_versions = lambda: {}
+    return create_processor(ak.ArknightsResourceProcessor, astgenne, output, args)
+
+
+def measure(func: Callable[[], Any], repeat: int, setup: Callable[[], Any] = None) -> Dict[str, Any]:
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return {
+        "seconds": seconds,
+        "min": min(seconds),
+        "median": statistics.median(seconds),
+    }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-o", "--output", default="bench.json")
+    parser.add_argument("--fixture", default=None, help="Reuse or keep the fixture tree in this folder")
+    parser.add_argument("--chars", type=int, default=200)
+    parser.add_argument("--skins", type=int, default=2)
+    parser.add_argument("--enemies", type=int, default=100)
+    parser.add_argument("--stamps", type=int, default=50)
+    parser.add_argument("--size", type=int, default=512, help="Short side of the source images")
+    parser.add_argument("--aspect", type=float, nargs="+", default=[1.0, 1.5, 0.75])
+    parser.add_argument("--avatar_size", type=int, default=128)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp:
+        root = Path(args.fixture) if args.fixture is not None else Path(temp)
+        astgenne = root / "Astgenne"
+        if not (astgenne / "versions.json").is_file():
+            print(f"Create fixture in {astgenne}")
+            make_fixture(astgenne, args)
+
+        results = {}
+        ak_proc = create_ak_processor(astgenne, root / "out/ak", args)
+        ba_proc = create_processor(BlueArchiveResourceProcessor, astgenne, root / "out/ba", args)
+        # silence per-run logging from the processors
+        logging.getLogger().setLevel(logging.WARNING)
+
+        ak_chars, ak_paths, _ = ak_proc.get_chars()
+        ba_chars, ba_paths, _ = ba_proc.get_chars()
+        results["ak.get_chars"] = measure(ak_proc.get_chars, args.repeat)
+        results["ba.get_chars"] = measure(ba_proc.get_chars, args.repeat)
+
+        sources = [ak_paths[img] for ch in ak_chars for img in ch.images]
+        images = [Image.open(src) for src in sources]
+        for img in images:
+            img.load()
+        results["scale_and_crop"] = measure(
+            lambda: [scale_and_crop(img, args.avatar_size, {}) for img in images], args.repeat)
+        dst = root / "out/process_image.webp"
+        results["process_image"] = measure(
+            lambda: [process_image(src, dst, args.avatar_size, {}) for src in sources], args.repeat)
+        del images
+
+        def clean_avatars():
+            # Remove outputs and manifests, so every run is a full build
+            for file in sorted((root / "out/ak").rglob("*"), reverse=True):
+                if file.is_file() and file.parent.name != ".cache":
+                    file.unlink()
+
+        results["_process_image_list"] = measure(
+            lambda: ak_proc._process_avatars(ak_chars, ak_paths, {}), args.repeat, clean_avatars)
+        results["_process_image_list.noop"] = measure(
+            lambda: ak_proc._process_avatars(ak_chars, ak_paths, {}), args.repeat)
+
+        json_file = root / "out/char.json"
+        all_chars = ak_chars + ba_chars
+        filters = ak_proc.get_filters() + ba_proc.get_filters()
+        results["write_list.Character"] = measure(lambda: write_list(Character, json_file, all_chars), args.repeat)
+        results["write_list.FilterGroup"] = measure(lambda: write_list(FilterGroup, json_file, filters), args.repeat)
+        results["yaml.load.chars"] = measure(
+            lambda: OmegaConf.load(resource_project_folder / "blue_archive/data/chars.yaml"), args.repeat)
+
+    items = {
+        "ak.get_chars": len(ak_chars),
+        "ba.get_chars": len(ba_chars),
+        "scale_and_crop": len(sources),
+        "process_image": len(sources),
+        "_process_image_list": len(sources),
+        "_process_image_list.noop": len(sources),
+        "write_list.Character": len(all_chars),
+        "write_list.FilterGroup": len(filters),
+    }
+    for key, count in items.items():
+        results[key]["items"] = count
+
+    report = {
+        "config": vars(args),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    write_json(Path(args.output).resolve(), report)
+    for key, res in results.items():
+        print(f"{key:28s} {res['median']:9.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Import-time regression check for the resource scripts.
+
+    source init.source
+    python benchmarks/import_time.py --budget_ms 150
+
+Each entry point is imported in a fresh interpreter with `python -X importtime`. The check fails if
+an import takes longer than the budget, or if it pulls in a dependency that should only be loaded by
+the stage using it.
+"""
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, List
+
+resource_project_folder = Path(__file__).parent.parent
+
+# Also the budget of tests/test_import_time.py
+default_budget_ms = 150
+
+entry_points = [
+    "arknights.get_resources",
+    "blue_archive.get_resources_v3",
+    "blue_archive.get_avatar_bg",
+    "utils.fix_font",
+]
+
+lazy_modules = [
+    "PIL",
+    "numpy",
+    "dataclasses_json",
+    "omegaconf",
+    "requests",
+    "romkan",
+    "tqdm",
+    "fontTools",
+]
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=resource_project_folder,
+    )
+    # import time: self [us] | cumulative | imported package
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = [s.strip() for s in line[len("import time:"):].split("|")]
+        result[name.strip()] = int(cumulative)
+    return result
+
+
+def eager_imports(times: Dict[str, int]) -> List[str]:
+    """Lazily loaded packages which were imported anyway."""
+    return sorted(m for m in times if m.split(".")[0] in lazy_modules and "." not in m)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--budget_ms", type=float, default=default_budget_ms)
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs is compared to the budget")
+    args = parser.parse_args()
+
+    failed = False
+    for module in entry_points:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best_ms = min(run[module] for run in runs) / 1000
+        eager = eager_imports(runs[0])
+
+        ok = best_ms <= args.budget_ms and len(eager) == 0
+        failed = failed or not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {module:32s} {best_ms:8.1f} ms" + (f"  eager: {', '.join(eager)}" if eager else ""))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
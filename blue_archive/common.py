@@ -1,9 +1,10 @@
 import json
 from dataclasses import dataclass, field
-from typing import Callable, Optional, TypeVar
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
 
-import romkan
-from dataclasses_json import Undefined, dataclass_json
+from utils.file_utils import file_hash
+from utils.json_utils import read_json, write_json
 
 T = TypeVar("T")
 
@@ -16,7 +17,6 @@ all_langs = [
 ]
 
 
-@dataclass_json(undefined=Undefined.EXCLUDE)
 @dataclass
 class LocalizeCharProfile:
     CharacterId: int
@@ -29,14 +29,12 @@ class LocalizeCharProfile:
     PersonalNameRubyJp: str = field(default="")
 
 
-@dataclass_json(undefined=Undefined.EXCLUDE)
 @dataclass
 class ScenarioCharacterName:
     NameJP: str
     SmallPortrait: str
 
 
-@dataclass_json
 @dataclass
 class CharData:
     id: str
@@ -75,7 +73,8 @@ class CharLangData:
 @dataclass
 class GroupLangData:
     id: str
-    name: dict[str, str]
+    name: dict[str, Optional[str]]
+    short_name: Optional[dict[str, Optional[str]]] = field(default=None)
 
 
 @dataclass
@@ -85,18 +84,71 @@ class GroupData:
 
 
 def load_excel_table_list(cls: Callable[[], T], file: str) -> list[T]:
+    # Only needed for excel tables, so it's not imported with the module
+    from dataclasses_json import Undefined, dataclass_json
+
     with open(file, "r", encoding="utf-8-sig") as f:
         data = json.load(f)["DataList"]
 
-    return [cls.from_dict(d) for d in data]
+    schema = dataclass_json(undefined=Undefined.EXCLUDE)(cls)
+    return [schema.from_dict(d) for d in data]
 
 
 def name_to_id(name: str) -> str:
+    import romkan
+
     roma = romkan.to_roma(name)
     return roma[0].upper() + roma[1:]
 
+@dataclass
 class SimpleCharData:
     family_name: str
     family_name_ruby: str
     image_files: list[str]
     personal_name: str
+
+
+# Bump when the dataclasses above change, to invalidate compiled configs
+config_cache_version = 2
+
+
+def compile_config(node: Any, cls: Optional[type]) -> Any:
+    """Validate a loaded YAML list or dict of `cls` items and convert it into plain containers."""
+    from omegaconf import ListConfig, OmegaConf
+
+    if cls is None:
+        return OmegaConf.to_container(node, throw_on_missing=True)
+    schema = OmegaConf.structured(cls)
+    # Unknown keys fail in merge, and missing required fields (left as "???" by the schema) fail in to_container
+    if isinstance(node, ListConfig):
+        return [OmegaConf.to_container(OmegaConf.merge(schema, item), throw_on_missing=True) for item in node]
+    return {k: OmegaConf.to_container(OmegaConf.merge(schema, v), throw_on_missing=True) for k, v in node.items()}
+
+
+def load_config(file: Path, cls: Optional[type], cache_dir: Optional[Path] = None) -> Any:
+    """
+    Load a YAML file as a list or dict of plain `cls` objects, or as plain containers if `cls` is None.
+    Validated data is cached as JSON keyed by the file hash, so YAML is only parsed after the file changed.
+    """
+    file = Path(file)
+    data = None
+    cache_file = None
+    if cache_dir is not None:
+        name = f"{file.parent.name}-{file.stem}"
+        cache_file = Path(cache_dir) / f"{name}-{config_cache_version}-{file_hash(file)[:16]}.json"
+        data = read_json(cache_file, lambda: None)
+
+    if data is None:
+        from omegaconf import OmegaConf
+
+        data = compile_config(OmegaConf.load(file), cls)
+        if cache_file is not None:
+            for old_file in Path(cache_dir).glob(f"{name}-*.json"):
+                old_file.unlink()
+            write_json(cache_file, data)
+
+    if cls is None:
+        return data
+    if isinstance(data, list):
+        return [cls(**d) for d in data]
+    return {k: cls(**v) for k, v in data.items()}
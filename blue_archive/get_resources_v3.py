@@ -1,16 +1,17 @@
 import glob
+from argparse import ArgumentParser
+from collections import defaultdict
 from pathlib import Path
 import shutil
 from typing import Dict, List, Tuple
 
-from omegaconf import OmegaConf
-
 from blue_archive.common import (
     CharLangData,
     GroupData,
     GroupLangData,
     SimpleCharData,
     all_langs,
+    load_config,
     name_to_id,
 )
 from utils.models import Character, FilterGroup
@@ -30,7 +31,7 @@ def get_default_lang_data(cid: str, data: SimpleCharData) -> CharLangData:
         jp_name = data.personal_name
         en_name = " ".join([s[0].upper() + s[1:] for s in cid.split("_") if s != "npc"])
 
-    return OmegaConf.structured(CharLangData(
+    return CharLangData(
         cid,
         {
             "ja": jp_name,
@@ -39,12 +40,19 @@ def get_default_lang_data(cid: str, data: SimpleCharData) -> CharLangData:
             "zh-cn": "",
             "zh-tw": "",
         },
-    ))
+    )
 
 
 class BlueArchiveResourceProcessor(ResourceProcessor):
     def __init__(self) -> None:
         super().__init__("ba")
+        self.config_cache = Path(self.args.cache) / "config"
+
+    def configure_parser(self, parser: ArgumentParser) -> ArgumentParser:
+        # --size is the option of the former standalone get_avatar_bg.py
+        parser.add_argument("--avatar_bg_size", "--size", type=int, default=200)
+        parser.add_argument("--skip_avatar_bgs", action="store_true")
+        return parser
 
     def get_chars(self) -> Tuple[List[Character], Dict[str, Path]]:
         res_root = self.res_root / "assets"
@@ -52,19 +60,27 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
         unused_char_files = set([f.stem for f in chars_res_root.glob("*.png") if not f.stem.strip().endswith("_Small")])
         unused_char_files.remove("Student_Portrait_Serika_Shibasek")
 
-        chars: dict[str, SimpleCharData] = OmegaConf.load(script_dir / "data/chars.yaml")
+        chars: dict[str, SimpleCharData] = load_config(script_dir / "data/chars.yaml", SimpleCharData, self.config_cache)
+
+        club_data: list[GroupData] = load_config(script_dir / "data/clubs.yaml", GroupData, self.config_cache)
+        school_data: list[GroupData] = load_config(script_dir / "data/schools.yaml", GroupData, self.config_cache)
 
-        club_data: list[GroupData] = OmegaConf.load(script_dir / "data/clubs.yaml")
-        school_data: list[GroupData] = OmegaConf.load(script_dir / "data/schools.yaml")
-        group_data = club_data + school_data
+        # character id -> group ids, so the character loop doesn't scan every group
+        char_groups: dict[str, set[str]] = defaultdict(set)
+        for gp in club_data + school_data:
+            for member in gp.members:
+                char_groups[member].add(gp.id)
+        school_ids = set(gp.id for gp in school_data)
+        club_ids = set(gp.id for gp in club_data)
 
-        with open(script_dir / "lang/char.yaml", "r", encoding="utf-8") as f:
-            translations: dict[str, CharLangData] = {t.id: t for t in OmegaConf.load(f)}
+        translations: dict[str, CharLangData] = {
+            t.id: t for t in load_config(script_dir / "lang/char.yaml", CharLangData, self.config_cache)
+        }
 
         result: list[Character] = []
         avatar_files = {}
         image_config = {}
-        updated_translations = False
+        new_translations: list[CharLangData] = []
         chars_without_school: list[Character] = []
         chars_without_club: list[Character] = []
 
@@ -73,10 +89,10 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
             if trans is None:
                 print(f"New translation: {cid}")
                 trans = translations[cid] = get_default_lang_data(cid, data)
-                updated_translations = True
+                new_translations.append(trans)
 
             # Get short_name by splitting full name, unless manually translated
-            short_name = dict(trans.short_name) if "short_name" in trans and trans.short_name is not None else {}
+            short_name = dict(trans.short_name) if trans.short_name is not None else {}
             for lang in all_langs:
                 if lang not in short_name or len(short_name[lang]) == 0:
                     short_name[lang] = trans.name[lang].split(" ")[-1]
@@ -86,7 +102,7 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
                 translations[cid].name,
                 short_name,
                 [],
-                sorted([gp.id for gp in group_data if cid in gp.members]),
+                sorted(char_groups[cid]),
             )
 
             # Get avatar files
@@ -111,15 +127,20 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
 
             char.images = sorted(char.images)
             result.append(char)
-            if len([gp for gp in school_data if cid in gp.members]) == 0:
+            if len(char_groups[cid] & school_ids) == 0:
                 chars_without_school.append(char)
-            if len([gp for gp in club_data if cid in gp.members]) == 0:
+            if len(char_groups[cid] & club_ids) == 0:
                 chars_without_club.append(char)
 
-        if updated_translations:
+        if len(new_translations) > 0:
+            from omegaconf import OmegaConf
+
+            # Add to the original YAML nodes, so existing entries are written back unchanged
+            with open(script_dir / "lang/char.yaml", "r", encoding="utf-8") as f:
+                entries = list(OmegaConf.load(f)) + [OmegaConf.structured(t) for t in new_translations]
             with open(script_dir / "lang/char.yaml", "w", encoding="utf-8") as f:
                 f.write(OmegaConf.to_yaml(
-                    sorted(translations.values(), key=lambda x: x.id.lower()), sort_keys=True))
+                    sorted(entries, key=lambda x: x.id.lower()), sort_keys=True))
 
         if len(unused_char_files) > 0:
             print("Unused char files:")
@@ -143,12 +164,11 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
 
     def get_filters(self) -> List[FilterGroup]:
         result = []
-        type_names = OmegaConf.to_container(OmegaConf.load(script_dir / "lang/group_types.yaml"))
+        type_names = load_config(script_dir / "lang/group_types.yaml", None, self.config_cache)
         for key in ["schools", "clubs"]:
-            groups: list[GroupLangData] = OmegaConf.load(script_dir / f"lang/{key}.yaml")
+            groups: list[GroupLangData] = load_config(script_dir / f"lang/{key}.yaml", GroupLangData, self.config_cache)
             groups = sorted(groups, key=lambda gp: gp.id)
             for gp in groups:
-                gp.name = OmegaConf.to_container(gp.name)
                 gp.name = {k: gp.name[k] or "" for k in all_langs}
             result.append(FilterGroup(
                 key,
@@ -160,6 +180,37 @@ class BlueArchiveResourceProcessor(ResourceProcessor):
 
         return result
 
+    def get_stage_configs(self) -> Dict[str, List[Path]]:
+        groups = [script_dir / "data/clubs.yaml", script_dir / "data/schools.yaml"]
+        filters = [script_dir / "lang/group_types.yaml", script_dir / "lang/clubs.yaml", script_dir / "lang/schools.yaml"]
+        return {
+            "chars": [script_dir / "data/chars.yaml", script_dir / "lang/char.yaml"] + groups,
+            "filters": filters,
+        }
+
+    def _enabled_stages(self) -> List[str]:
+        stages = super()._enabled_stages()
+        if not self.args.skip_avatar_bgs:
+            stages.append("avatar_bgs")
+        return stages
+
+    def _process_extra_stages(self, stages: List[str]):
+        if "avatar_bgs" in stages:
+            with self._stage("avatar_bgs"):
+                self._process_avatar_bgs()
+            self._record_stage("avatar_bgs")
+
+    def _process_avatar_bgs(self):
+        in_root = self.res_root / "assets/UIs/01_Common/14_CharacterCollect"
+        out_root = self.out_root / "avatar-bg"
+        files = sorted(in_root.glob("BG_*_Collection.png"))
+        self._process_image_list(
+            "avatar-bg",
+            files,
+            [[(out_root / f"{f.stem.split('_')[1]}.webp", self.args.avatar_bg_size)] for f in files],
+            {str(f): {"mode": "center_crop"} for f in files},
+        )
+
 
 if __name__ == "__main__":
     BlueArchiveResourceProcessor().main()
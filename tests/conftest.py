@@ -0,0 +1,96 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+# Same as `source init.source`
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class StandInServer:
+    """Local HTTP server with ETag, Last-Modified and Range support, standing in for GitHub and asset hosts."""
+
+    def __init__(self) -> None:
+        self.files: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        self.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+        # path -> number of bytes sent before the connection is dropped, for the next request only
+        self.drop_after: Dict[str, int] = {}
+        # path -> status codes sent before the file, one per request
+        self.errors: Dict[str, List[int]] = {}
+        self.requests = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                if len(server.errors.get(self.path, [])) > 0:
+                    self.send_response(server.errors[self.path].pop(0))
+                    self.end_headers()
+                    return
+                content = server.files.get(self.path)
+                if content is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                etag = server.etags[self.path]
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                start = 0
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if range_header is not None and if_range in (None, etag, server.last_modified):
+                    start = int(range_header[len("bytes="):].rstrip("-"))
+                    if start >= len(content):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(content)}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(content) - start))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", server.last_modified)
+                self.end_headers()
+
+                body = content[start:]
+                drop = server.drop_after.pop(self.path, None)
+                if drop is not None:
+                    self.wfile.write(body[:drop])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def set_file(self, path: str, content: bytes, etag: Optional[str] = None):
+        self.files[path] = content
+        self.etags[path] = etag or f'"{hash(content) & 0xffffffff:x}"'
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+
+@pytest.fixture
+def http_server():
+    pytest.importorskip("requests")
+    server = StandInServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
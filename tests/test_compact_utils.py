@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+from utils import compact_utils
+from utils.compact_utils import compact_path, decode_list, encode_list, write_compact
+from utils.models import Character, FilterGroup
+
+characters = [
+    Character(
+        "char_002_amiya",
+        {"zh-cn": "阿米娅", "ja": "アーミヤ", "en": "Amiya", "ko": "아미야", "zh-tw": "阿米婭"},
+        {"en": "Amiya"},
+        ["char_002_amiya", "char_002_amiya_2"],
+        ["Amiya", ":#type-char"],
+        {"char_002_amiya": ["characters/char_002_amiya.webp", "characters/256/char_002_amiya.webp"]},
+        {"char_002_amiya_2": "shared/00ff"},
+    ),
+    Character("enemy_1000_gopro", {"zh-cn": "源石虫", "en": ""}, {}, [], [":#type-enemy"]),
+    Character("ko_only", {"ko": "이름"}, {"ko": "이름"}, ["ko_only"], []),
+]
+filters = [
+    FilterGroup(
+        "type",
+        {"en": "Type", "ja": "タイプ"},
+        [":#type-char", ":#type-enemy"],
+        [{"en": "Operator"}, {"en": "Enemy", "zh-cn": "敌人"}],
+        [True, False],
+    ),
+    FilterGroup("empty", {}, [], [], []),
+]
+
+
+@pytest.mark.parametrize("cls, data", [(Character, characters), (FilterGroup, filters), (Character, []), (FilterGroup, [])])
+def test_round_trip(cls, data):
+    encoded = json.loads(json.dumps(encode_list(cls, data)))
+    assert decode_list(cls, encoded) == data
+
+
+def test_shared_tables():
+    encoded = encode_list(Character, characters)
+    assert encoded["langs"] == ["en", "ja", "ko", "zh-cn", "zh-tw"]
+    # Each string is stored once
+    assert len(encoded["strings"]) == len(set(encoded["strings"]))
+    assert encoded["strings"].count("Amiya") == 1
+
+
+def test_unknown_version():
+    encoded = encode_list(Character, characters)
+    encoded["version"] += 1
+    with pytest.raises(ValueError):
+        decode_list(Character, encoded)
+
+
+def test_write_compact(tmp_path):
+    file = compact_path(tmp_path / "char.json")
+    assert file.name == "char.min.json"
+
+    write_compact(Character, file, characters)
+
+    content = file.read_bytes()
+    assert b"\n" not in content and b": " not in content
+    assert decode_list(Character, json.loads(content)) == characters
+    assert gzip.decompress((tmp_path / "char.min.json.gz").read_bytes()) == content
+
+
+def test_write_compact_brotli(tmp_path):
+    brotli = pytest.importorskip("brotli")
+    file = tmp_path / "filters.min.json"
+
+    write_compact(FilterGroup, file, filters)
+
+    assert brotli.decompress((tmp_path / "filters.min.json.br").read_bytes()) == file.read_bytes()
+
+
+def test_write_compact_without_brotli_removes_outdated_br(tmp_path, monkeypatch):
+    monkeypatch.setattr(compact_utils, "brotli", None)
+    file = tmp_path / "filters.min.json"
+    (tmp_path / "filters.min.json.br").write_bytes(b"outdated")
+
+    write_compact(FilterGroup, file, filters)
+
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["filters.min.json", "filters.min.json.gz"]
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from utils.image_utils import scale_and_crop  # noqa: E402
+
+# Resampling only the kept region with a box rounds differently from resizing everything and cropping
+tolerance = 2
+
+
+def resize_then_crop(img, size, config):
+    """The previous implementation: resize the whole image, then crop (with NumPy slicing, same as crop)."""
+    w, h = img.width, img.height
+    scale = size / min(w, h)
+    img = img.resize((int(round(w * scale)), int(round(h * scale))), resample=Image.Resampling.LANCZOS)
+
+    w, h = img.width, img.height
+    if w > h:
+        cw = (w - h) // 2
+        return img.crop((cw, 0, cw + h, h))
+    if h > w:
+        h_crop = config.get("h_crop", "center")
+        ch = 0 if h_crop == "top" else h - w if h_crop == "bottom" else (h - w) // 2
+        return img.crop((0, ch, w, ch + w))
+    return img
+
+
+def make_image(mode, w, h, seed):
+    rng = random.Random(seed)
+    img = Image.frombytes(mode, (w, h), rng.randbytes(w * h * len(mode)))
+    if mode == "RGBA":
+        # Character art has fully transparent areas next to opaque ones
+        alpha = Image.new("L", (w, h), 0)
+        alpha.paste(255, (w // 4, h // 4, w * 3 // 4, h * 3 // 4))
+        img.putalpha(alpha)
+    return img
+
+
+def max_difference(a, b) -> int:
+    return max(abs(x - y) for x, y in zip(a.tobytes(), b.tobytes()))
+
+
+sizes = [(300, 200), (200, 300), (257, 513), (640, 480), (128, 128), (999, 1001), (1024, 4096)]
+
+
+@pytest.mark.parametrize("w, h", sizes)
+@pytest.mark.parametrize("h_crop", ["top", "center", "bottom"])
+def test_scale_and_crop_rgb(w, h, h_crop):
+    img = make_image("RGB", w, h, seed=w * h)
+    config = {"h_crop": h_crop}
+
+    result = scale_and_crop(img, 128, config)
+    expected = resize_then_crop(img, 128, config)
+
+    assert result.size == expected.size == (128, 128)
+    assert max_difference(result, expected) <= tolerance
+
+
+@pytest.mark.parametrize("w, h", sizes)
+@pytest.mark.parametrize("h_crop", ["top", "center", "bottom"])
+def test_scale_and_crop_rgba(w, h, h_crop):
+    img = make_image("RGBA", w, h, seed=w * h)
+    config = {"h_crop": h_crop}
+
+    result = scale_and_crop(img, 128, config)
+    expected = resize_then_crop(img, 128, config)
+
+    assert result.size == expected.size == (128, 128)
+    # Compared premultiplied: where alpha is close to 0, un-premultiplied colors can differ by up to 255,
+    # but they're invisible
+    assert max_difference(result.convert("RGBa"), expected.convert("RGBa")) <= tolerance
+    assert max_difference(result.getchannel("A"), expected.getchannel("A")) <= tolerance
+
+
+def test_scale_and_crop_h_crop():
+    # Top half red, bottom half blue, so the crop position shows in the corners
+    img = Image.new("RGB", (100, 400), (255, 0, 0))
+    img.paste((0, 0, 255), (0, 200, 100, 400))
+
+    assert scale_and_crop(img, 50, {"h_crop": "top"}).getpixel((25, 49)) == (255, 0, 0)
+    assert scale_and_crop(img, 50, {"h_crop": "bottom"}).getpixel((25, 0)) == (0, 0, 255)
+    center = scale_and_crop(img, 50, {})
+    assert center.getpixel((25, 0)) == (255, 0, 0)
+    assert center.getpixel((25, 49)) == (0, 0, 255)
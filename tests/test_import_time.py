@@ -0,0 +1,12 @@
+import pytest
+
+from benchmarks.import_time import default_budget_ms, eager_imports, entry_points, import_times
+
+
+@pytest.mark.parametrize("module", entry_points)
+def test_entry_point_imports_lazily(module):
+    # Best of 3, so one slow run on a busy machine doesn't fail the test
+    runs = [import_times(module) for _ in range(3)]
+
+    assert eager_imports(runs[0]) == []
+    assert min(run[module] for run in runs) / 1000 <= default_budget_ms
@@ -0,0 +1,81 @@
+import json
+import os
+from dataclasses import asdict, fields
+
+import pytest
+
+from utils import json_utils
+from utils.json_utils import dumps_list, write_json, write_list
+from utils.models import Character, FilterGroup
+
+characters = [
+    Character(
+        "char_002_amiya",
+        {"zh-cn": "阿米娅", "ja": "アーミヤ", "en": "Amiya", "ko": "아미야", "zh-tw": "阿米婭"},
+        {"zh-cn": "阿米娅", "en": "Amiya"},
+        ["char_002_amiya", "char_002_amiya_2"],
+        ["Amiya", ":#type-char", "quote \" and \\ backslash", "emoji 😀", "tab\tnew\nline"],
+        {"char_002_amiya": ["characters/char_002_amiya.webp", "characters/256/char_002_amiya.webp"]},
+    ),
+    Character("enemy_1000_gopro", {"zh-cn": "源石虫"}, {}, [], [":#type-enemy"], {}, {"enemy_1000_gopro": "shared/00ff"}),
+    Character("empty", {}, {}, [], []),
+]
+filters = [
+    FilterGroup("type", {"en": "Type", "ja": "タイプ"}, [":#type-char"], [{"en": "Operator"}], [True]),
+    FilterGroup("none", {}, [], [], []),
+]
+
+
+def reference_dumps(data) -> bytes:
+    """The json module with the output settings of char.json, leaving out empty `omit_empty` fields."""
+    items = []
+    for item in data:
+        d = asdict(item)
+        for f in fields(item):
+            if f.metadata.get("omit_empty") and len(d[f.name]) == 0:
+                del d[f.name]
+        items.append(d)
+    return json.dumps(items, indent=2, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(json_utils, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("cls, data", [(Character, characters), (FilterGroup, filters), (Character, [])])
+def test_dumps_list_is_byte_identical(backend, cls, data):
+    assert dumps_list(cls, data) == reference_dumps(data)
+
+
+def test_empty_optional_fields_are_omitted():
+    items = json.loads(dumps_list(Character, characters))
+    assert "aliases" not in items[0] and "renditions" in items[0]
+    assert "renditions" not in items[1] and "aliases" in items[1]
+    assert "renditions" not in items[2] and "aliases" not in items[2]
+
+
+def test_write_list_skips_unchanged(tmp_path):
+    file = tmp_path / "char.json"
+    content_hash = write_list(Character, file, characters)
+    assert file.read_bytes() == reference_dumps(characters)
+
+    os.utime(file, ns=(0, 0))
+    assert write_list(Character, file, characters) == content_hash
+    assert file.stat().st_mtime_ns == 0
+    assert list(tmp_path.iterdir()) == [file]
+
+    assert write_list(Character, file, characters[:1]) != content_hash
+    assert file.read_bytes() == reference_dumps(characters[:1])
+
+
+def test_write_json(tmp_path):
+    file = tmp_path / "versions.json"
+    write_json(file, {"b": 1, "a": "é"})
+    assert file.read_text(encoding="utf-8") == '{\n  "a": "é",\n  "b": 1\n}'
+    write_json(file, {"b": 1, "a": "é"}, minify=True)
+    assert file.read_text(encoding="utf-8") == '{"a":"é","b":1}'
@@ -0,0 +1,37 @@
+import base64
+
+import pytest
+
+pytest.importorskip("romkan")
+
+from utils.models import Character  # noqa: E402
+from utils.search_utils import build_search_index, normalize, tokens  # noqa: E402
+
+
+def test_normalize():
+    assert normalize("ＡＭＩＹＡ") == "amiya"
+    assert normalize("ｱｰﾐﾔ") == normalize("アーミヤ") == "あーみや"
+
+
+def test_tokens():
+    result = tokens("Texas the Omertosa")
+    assert {"texas", "the", "omertosa", "texastheomertosa"} <= result
+    assert "あみや" in tokens("Amiya")
+    assert "sora" in tokens("ソラ")
+
+
+def test_build_search_index():
+    characters = [
+        Character("amiya", {"ja": "アーミヤ", "en": "Amiya"}, {}, [], [":#type-char"]),
+        Character("gopro", {"en": "Originium Slug"}, {}, [], [":#type-enemy", "slug"]),
+    ]
+    index = build_search_index(characters, {":#type-char", ":#type-enemy"})
+
+    assert index["ids"] == ["amiya", "gopro"]
+    assert index["grams"]["ami"] == [0]
+    assert index["grams"]["あーみ"] == [0]
+    assert index["grams"]["slug"] == [1]
+    assert all(len(gram) <= index["max_prefix"] for gram in index["grams"])
+    assert base64.b64decode(index["tags"][":#type-enemy"]) == bytes([0b10])
+    # Tags are not text
+    assert ":#ty" not in index["grams"]
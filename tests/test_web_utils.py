@@ -0,0 +1,120 @@
+import pytest
+
+from utils import web_utils
+from utils.web_utils import download_file
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(web_utils, "retry_backoff", 0)
+    # Small chunks, so data received before a dropped connection is written
+    monkeypatch.setattr(web_utils, "chunk_size", 1024)
+
+
+def test_download_file(http_server, tmp_path):
+    content = bytes(range(256)) * 1000
+    http_server.set_file("/asset.bin", content)
+    dst = tmp_path / "asset.bin"
+
+    download_file(http_server.url("/asset.bin"), str(dst))
+
+    assert dst.read_bytes() == content
+    assert list(tmp_path.iterdir()) == [dst]
+
+
+def test_download_file_resumes_after_dropped_connection(http_server, tmp_path):
+    content = bytes(range(256)) * 1000
+    http_server.set_file("/asset.bin", content)
+    http_server.drop_after["/asset.bin"] = 10000
+    dst = tmp_path / "asset.bin"
+
+    download_file(http_server.url("/asset.bin"), str(dst))
+
+    assert dst.read_bytes() == content
+    resumed = http_server.requests[-1][1]
+    # Resumed from the last complete chunk
+    assert 0 < int(resumed["Range"][len("bytes="):].rstrip("-")) <= 10000
+    assert resumed["If-Range"] == http_server.etags["/asset.bin"]
+
+
+def test_download_file_restarts_when_resource_changed(http_server, tmp_path, monkeypatch):
+    http_server.set_file("/asset.bin", b"old" * 1000, etag='"old"')
+    http_server.drop_after["/asset.bin"] = 2500
+    dst = tmp_path / "asset.bin"
+    with monkeypatch.context() as m:
+        # Don't retry, so the old partial file is left behind
+        m.setattr(web_utils, "max_retries", 0)
+        with pytest.raises(Exception):
+            download_file(http_server.url("/asset.bin"), str(dst))
+    assert (tmp_path / "asset.bin.part").stat().st_size > 0
+
+    new_content = b"new" * 2000
+    http_server.set_file("/asset.bin", new_content, etag='"new"')
+    http_server.last_modified = "Tue, 02 Jan 2024 00:00:00 GMT"
+    download_file(http_server.url("/asset.bin"), str(dst))
+
+    assert dst.read_bytes() == new_content
+
+
+def test_download_file_restarts_stale_complete_part(http_server, tmp_path):
+    # A partial file longer than the resource gets a 416, it must not be renamed into place
+    content = b"abc" * 100
+    http_server.set_file("/asset.bin", content, etag='"v1"')
+    dst = tmp_path / "asset.bin"
+    (tmp_path / "asset.bin.part").write_bytes(b"x" * 1000)
+    (tmp_path / "asset.bin.part.json").write_text(f'{{"url": "{http_server.url("/asset.bin")}", "etag": "\\"v1\\""}}')
+
+    download_file(http_server.url("/asset.bin"), str(dst))
+
+    assert dst.read_bytes() == content
+
+
+def test_download_file_discards_part_without_validator(http_server, tmp_path):
+    content = b"abc" * 100
+    http_server.set_file("/asset.bin", content)
+    dst = tmp_path / "asset.bin"
+    (tmp_path / "asset.bin.part").write_bytes(b"stale")
+
+    download_file(http_server.url("/asset.bin"), str(dst))
+
+    assert dst.read_bytes() == content
+    assert "Range" not in http_server.requests[-1][1]
+
+
+def test_download_json_revalidates_with_etag(http_server, tmp_path):
+    http_server.set_file("/table.json", b'{"a": 1}')
+    url = http_server.url("/table.json")
+
+    assert web_utils.download_json(url, tmp_path) == {"a": 1}
+    assert web_utils.download_json(url, tmp_path) == {"a": 1}
+
+    # Second request is answered from the cache with a 304
+    assert http_server.requests[-1][1]["If-None-Match"] == http_server.etags["/table.json"]
+
+    http_server.set_file("/table.json", b'{"a": 2}')
+    assert web_utils.download_json(url, tmp_path) == {"a": 2}
+
+
+def test_download_json_without_cache(http_server):
+    http_server.set_file("/table.json", b"[1, 2]")
+    assert web_utils.download_json(http_server.url("/table.json")) == [1, 2]
+    assert "If-None-Match" not in http_server.requests[-1][1]
+
+
+def test_download_json_all_keeps_order(http_server, tmp_path):
+    paths = [f"/{lang}/character_table.json" for lang in ["cn", "jp", "us", "ko", "tw"]]
+    for i, path in enumerate(paths):
+        http_server.set_file(path, f'{{"i": {i}}}'.encode("utf-8"))
+
+    result = web_utils.download_json_all([http_server.url(path) for path in paths], tmp_path)
+
+    assert result == [{"i": i} for i in range(len(paths))]
+    assert web_utils.download_json_all([], tmp_path) == []
+
+
+def test_download_json_retries_server_errors(http_server):
+    http_server.set_file("/table.json", b"{}")
+    http_server.errors["/table.json"] = [503, 500]
+
+    assert web_utils.download_json(http_server.url("/table.json")) == {}
+    assert len(http_server.requests) == 3
@@ -15,11 +15,63 @@ def create_common_parser(output_name: str) -> ArgumentParser:
         "-o", "--output",
         default=(resource_project_foler.parent / f"closuretalk.github.io/resources/{output_name}").resolve(),
     )
+    parser.add_argument(
+        "--cache",
+        default=(resource_project_foler / ".cache"),
+        help="Folder for download and build caches",
+    )
     parser.add_argument("--avatar_size", type=int, default=128)
+    parser.add_argument("--avatar_renditions", type=int, nargs="*", default=[], help="Extra avatar sizes, saved under characters/<size>/")
+    parser.add_argument("--avatar_avif", action="store_true", help="Also save avatars as AVIF")
     parser.add_argument("--stamp_size", type=int, default=200)
     parser.add_argument("--skip_chars", action="store_true")
     parser.add_argument("--skip_avatars", action="store_true")
     parser.add_argument("--skip_stamps", action="store_true")
     parser.add_argument("--skip_filters", action="store_true")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Skip stages whose asset versions, configs and options did not change since their last successful run",
+    )
+    parser.add_argument("--dedup", action="store_true", help="Store identical avatars once under characters/shared/")
+    parser.add_argument(
+        "--dedup_phash",
+        type=int,
+        default=None,
+        help="Also deduplicate avatars whose perceptual hashes differ by at most this many bits",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Also write char.json / filters.json in the compact layout as *.min.json, with .gz and .br siblings",
+    )
+    parser.add_argument("--atlas", action="store_true", help="Also pack avatars and stamps into sprite sheets")
+    parser.add_argument("--atlas_size", type=int, default=2048)
+    parser.add_argument("--report", default=None, help="Run report JSON file, defaults to <cache>/<key>-report.json")
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Dump cProfile stats of a stage (e.g. chars, avatars) into the cache folder (worker processes are not profiled)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes for image processing")
+    parser.add_argument("--readers", type=int, default=4, help="Threads reading source images ahead of the workers (with -j > 1)")
+    parser.add_argument("--writers", type=int, default=2, help="Threads writing processed images (with -j > 1)")
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=None,
+        help="Max images in flight between reading and writing, defaults to 2 * jobs + readers",
+    )
+    parser.add_argument(
+        "--low_memory",
+        action="store_true",
+        help="Decode and reduce large sources at a coarse scale before the final LANCZOS resize",
+    )
+    parser.add_argument(
+        "--worker_memory_mb",
+        type=int,
+        default=None,
+        help="Address space limit of each image worker process (with -j > 1), an image over it fails with MemoryError",
+    )
 
     return parser
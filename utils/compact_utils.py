@@ -0,0 +1,184 @@
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, get_args, get_origin, get_type_hints
+
+from utils.file_utils import replace_file
+from utils.json_utils import field_names
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when the layout changes, clients check it before decoding
+compact_format_version = 1
+
+# Language maps, stored as arrays over the shared language table
+lang_fields = {"names", "short_names", "group_name", "filter_names"}
+
+
+def compact_path(file: Path) -> Path:
+    """char.json -> char.min.json"""
+    return file.with_suffix(".min.json")
+
+
+@lru_cache(maxsize=None)
+def field_types(cls) -> Dict[str, Any]:
+    return get_type_hints(cls)
+
+
+def _strings(value: Any, typ: Any):
+    origin = get_origin(typ)
+    if typ is str:
+        yield value
+    elif origin is list:
+        for item in value:
+            yield from _strings(item, get_args(typ)[0])
+    elif origin is dict:
+        for k, v in value.items():
+            yield k
+            yield from _strings(v, get_args(typ)[1])
+
+
+class CompactEncoder:
+    """
+    Columnar layout of a list of dataclasses: one array per field, with every string replaced by its
+    index in a shared string table (most used first), and language maps stored as arrays over a shared
+    language table (-1 where a language is missing).
+    """
+
+    def __init__(self, cls, data: List[Any]) -> None:
+        self.cls = cls
+        types = field_types(cls)
+        counts = Counter()
+        langs = set()
+        for item in data:
+            for name in field_names(cls):
+                value = getattr(item, name)
+                if name in lang_fields:
+                    maps = value if isinstance(value, list) else [value]
+                    langs.update(k for m in maps for k in m.keys())
+                    counts.update(v for m in maps for v in m.values())
+                else:
+                    counts.update(_strings(value, types[name]))
+        self.langs = sorted(langs)
+        self.lang_index = {lang: i for i, lang in enumerate(self.langs)}
+        self.strings = [s for s, _ in sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))]
+        self.string_index = {s: i for i, s in enumerate(self.strings)}
+
+    def encode(self, data: List[Any]) -> Dict[str, Any]:
+        types = field_types(self.cls)
+        return {
+            "version": compact_format_version,
+            "langs": self.langs,
+            "strings": self.strings,
+            "fields": list(field_names(self.cls)),
+            "columns": [
+                [self._encode_field(name, getattr(item, name), types[name]) for item in data]
+                for name in field_names(self.cls)
+            ],
+        }
+
+    def _encode_field(self, name: str, value: Any, typ: Any) -> Any:
+        if name in lang_fields:
+            if isinstance(value, list):
+                return [self._encode_langs(m) for m in value]
+            return self._encode_langs(value)
+        return self._encode(value, typ)
+
+    def _encode_langs(self, value: Dict[str, str]) -> List[int]:
+        result = [-1] * len(self.langs)
+        for lang, text in value.items():
+            result[self.lang_index[lang]] = self.string_index[text]
+        while len(result) > 0 and result[-1] == -1:
+            result.pop()
+        return result
+
+    def _encode(self, value: Any, typ: Any) -> Any:
+        origin = get_origin(typ)
+        if typ is str:
+            return self.string_index[value]
+        if typ is bool:
+            return int(value)
+        if origin is list:
+            return [self._encode(item, get_args(typ)[0]) for item in value]
+        if origin is dict:
+            # Flat [key, value, key, value, ...]
+            result = []
+            for k, v in value.items():
+                result += [self.string_index[k], self._encode(v, get_args(typ)[1])]
+            return result
+        return value
+
+
+def encode_list(cls, data: List[Any]) -> Dict[str, Any]:
+    return CompactEncoder(cls, data).encode(data)
+
+
+def decode_list(cls, encoded: Dict[str, Any]) -> List[Any]:
+    if encoded["version"] != compact_format_version:
+        raise ValueError(f"Unknown compact format {encoded['version']}")
+    langs = encoded["langs"]
+    strings = encoded["strings"]
+    types = field_types(cls)
+
+    def decode_langs(value: List[int]) -> Dict[str, str]:
+        return {langs[i]: strings[s] for i, s in enumerate(value) if s >= 0}
+
+    def decode(value: Any, typ: Any) -> Any:
+        origin = get_origin(typ)
+        if typ is str:
+            return strings[value]
+        if typ is bool:
+            return bool(value)
+        if origin is list:
+            return [decode(item, get_args(typ)[0]) for item in value]
+        if origin is dict:
+            return {strings[value[i]]: decode(value[i + 1], get_args(typ)[1]) for i in range(0, len(value), 2)}
+        return value
+
+    columns = []
+    for name, column in zip(encoded["fields"], encoded["columns"]):
+        if name in lang_fields and get_origin(types[name]) is list:
+            columns.append([[decode_langs(m) for m in value] for value in column])
+        elif name in lang_fields:
+            columns.append([decode_langs(value) for value in column])
+        else:
+            columns.append([decode(value, types[name]) for value in column])
+    return [cls(**dict(zip(encoded["fields"], values))) for values in zip(*columns)]
+
+
+def write_bytes(file, content: bytes) -> str:
+    def write(temp_file):
+        with open(temp_file, "wb") as f:
+            f.write(content)
+
+    return replace_file(file, write)
+
+
+def write_compact(cls, file: Path, data: List[Any]) -> str:
+    """
+    Write `data` in the compact layout, minified, with precompressed .gz and .br (if brotli is installed)
+    siblings for static hosting. Returns the content hash of the uncompressed file.
+    """
+    encoded = encode_list(cls, data)
+    # Cheap next to writing, and clients would silently get wrong data
+    if decode_list(cls, encoded) != data:
+        raise ValueError(f"{file} does not decode to the same data")
+    content = json.dumps(encoded, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    content_hash = write_bytes(file, content)
+    # mtime 0, so unchanged content gives the same bytes
+    write_bytes(f"{file}.gz", gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_bytes(f"{file}.br", brotli.compress(content, quality=11))
+    elif os.path.isfile(f"{file}.br"):
+        # Hosts prefer .br, an older one would be served instead of the new content
+        os.remove(f"{file}.br")
+        logging.warning(f"brotli is not installed, removed outdated {file}.br")
+    return content_hash
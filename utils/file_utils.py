@@ -0,0 +1,33 @@
+import hashlib
+import os
+
+
+def file_hash(file) -> str:
+    h = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def replace_file(file, write_func) -> str:
+    """
+    Write through a temporary file which replaces `file` when complete, so readers never see partial output.
+    If the content did not change, `file` is left untouched to keep its mtime. Returns the content hash.
+    """
+    os.makedirs(os.path.split(file)[0], exist_ok=True)
+    temp_file = f"{file}.tmp"
+    try:
+        write_func(temp_file)
+        content_hash = file_hash(temp_file)
+        unchanged = (
+            os.path.isfile(file)
+            and os.path.getsize(file) == os.path.getsize(temp_file)
+            and file_hash(file) == content_hash
+        )
+        if not unchanged:
+            os.replace(temp_file, file)
+        return content_hash
+    finally:
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
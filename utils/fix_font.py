@@ -1,27 +1,132 @@
+import os
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from fontTools import ttLib
-from fontTools.pens.areaPen import AreaPen
+from typing import List, Optional, Set
+
+from utils.file_utils import file_hash
+from utils.json_utils import read_json, write_json
+
+# Bump when the analysis changes, so cached results are not reused
+keep_cache_version = 2
+
+# Glyph sets of the worker processes, loaded once per worker
+_worker_glyphs = None
+
+
+def init_worker(file: str):
+    from fontTools import ttLib
+
+    global _worker_glyphs
+    _worker_glyphs = ttLib.TTFont(file, lazy=True).getGlyphSet()
+
+
+def non_empty_glyphs(names: List[str]) -> List[str]:
+    from fontTools.pens.areaPen import AreaPen
+
+    result = []
+    for name in names:
+        # The glyph set resolves components of composite glyphs
+        pen = AreaPen(_worker_glyphs)
+        _worker_glyphs[name].draw(pen)
+        # Signed by outline direction, which is clockwise in TrueType and counter-clockwise in CFF outlines
+        if pen.value != 0:
+            result.append(name)
+    return result
+
+
+def find_glyphs_to_keep(file: Path, jobs: int) -> List[str]:
+    """Names of glyphs with outlines, in font order. Glyphs are drawn in `jobs` processes."""
+    from fontTools import ttLib
+
+    names = ttLib.TTFont(file, lazy=True).getGlyphOrder()
+    # More chunks than workers, as glyph complexity varies across the font
+    chunk_size = max(1, len(names) // (jobs * 8) + 1)
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(str(file),)) as pool:
+        to_keep = [name for kept in pool.map(non_empty_glyphs, chunks) for name in kept]
+    if len(to_keep) == 0:
+        raise ValueError(f"No glyphs with outlines found in {file}")
+    return to_keep
+
+
+def load_glyphs_to_keep(file: Path, cache_dir: Optional[Path], jobs: int) -> List[str]:
+    if cache_dir is None:
+        return find_glyphs_to_keep(file, jobs)
+
+    cache_file = Path(cache_dir) / f"{file_hash(file)[:16]}-keep-{keep_cache_version}.json"
+    to_keep = read_json(cache_file, lambda: None)
+    if to_keep is None:
+        to_keep = find_glyphs_to_keep(file, jobs)
+        write_json(cache_file, to_keep)
+    else:
+        print(f"Use cached glyphs of {file.name}")
+    return to_keep
+
+
+def used_chars(files: List[str]) -> Set[str]:
+    """Characters of the names of all languages in char.json / filters.json files."""
+    texts = []
+    for file in files:
+        for item in read_json(file):
+            if "names" in item:
+                texts += item["names"].values()
+                texts += item["short_names"].values()
+            if "group_name" in item:
+                texts += item["group_name"].values()
+                for names in item["filter_names"]:
+                    texts += names.values()
+    return set("".join(texts))
+
+
+def subset_font(file: Path, dst: Path, to_keep: List[str], chars: Optional[Set[str]]):
+    from fontTools import subset, ttLib
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    font = ttLib.TTFont(file)
+    subsetter = subset.Subsetter(options)
+    if chars is None:
+        subsetter.populate(glyphs=to_keep)
+    else:
+        # Characters without outlines are left out, so browsers fall back to another font
+        keep = set(to_keep)
+        cmap = font.getBestCmap()
+        subsetter.populate(unicodes=[ord(c) for c in chars if cmap.get(ord(c)) in keep])
+    subsetter.subset(font)
+    subset.save_font(font, str(dst), options)
+
 
 def main():
     parser = ArgumentParser()
     parser.add_argument("file")
+    parser.add_argument("-o", "--output", default=None, help="Subset WOFF2 file, defaults to <file>-subset.woff2")
+    parser.add_argument(
+        "--used_by",
+        nargs="*",
+        default=[],
+        help="char.json / filters.json files, only characters of their names (and printable ASCII) are kept",
+    )
+    parser.add_argument(
+        "--cache",
+        default=(Path(__file__).parent.parent / ".cache/fonts"),
+        help="Folder for glyph analysis results, keyed by font hash",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     file = Path(args.file)
-    font = ttLib.TTFont(file, lazy=False)
-    glyphs = font.getGlyphSet()
-
-    to_keep = []
-    for name in font.getGlyphNames():
-        glyph = glyphs[name]
-        pen = AreaPen()
-        glyph.draw(pen)
-        if pen.value > 0:
-            to_keep.append(glyph.name)
-
-    print(f"Keep {len(to_keep)} / {len(glyphs)} glyphs")
-    (file.parent / f"{file.stem}-keep.txt").write_text("\n".join(to_keep))
+    glyphs = load_glyphs_to_keep(file, args.cache, args.jobs)
+    (file.parent / f"{file.stem}-keep.txt").write_text("\n".join(glyphs))
+
+    chars = None
+    if len(args.used_by) > 0:
+        chars = used_chars(args.used_by) | set(chr(c) for c in range(0x20, 0x7f))
+        print(f"{len(chars)} characters are used")
+
+    dst = Path(args.output) if args.output is not None else file.parent / f"{file.stem}-subset.woff2"
+    subset_font(file, dst, glyphs, chars)
+    print(f"Keep {len(glyphs)} glyphs, wrote {dst} ({os.path.getsize(file) / 1e6:.1f} MB -> {os.path.getsize(dst) / 1e6:.1f} MB)")
 
 if __name__ == "__main__":
     main()
@@ -1,33 +1,209 @@
-from typing import Any
+import io
+import os
+import time
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
 
-import numpy as np
-from PIL import Image
+from utils.stats_utils import peak_rss
 
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL is imported where it's used, so scripts start fast when no images are processed
+
+# Changing these invalidates all outputs recorded in build manifests
+WEBP_SAVE_OPTIONS = {"quality": 95, "method": 6}
+AVIF_SAVE_OPTIONS = {"quality": 80, "speed": 4}
+SAVE_OPTIONS = {
+    ".webp": WEBP_SAVE_OPTIONS,
+    ".avif": AVIF_SAVE_OPTIONS,
+}
+SAVE_FORMATS = {
+    ".webp": "WEBP",
+    ".avif": "AVIF",
+}
+
+
+def save_options(dst: str) -> dict[str, Any]:
+    return SAVE_OPTIONS[os.path.splitext(dst)[1].lower()]
+
+
+# With "low_memory" in the image config, sources are decoded at a reduced scale where the format allows it
+# (JPEG draft mode), and resized by integer reduction down to this many times the output size first
+low_memory_reducing_gap = 2.0
+
+
+def open_image(src: str, data: Optional[bytes] = None) -> "Image.Image":
+    """
+    Open and decode `src`. `data` is the content of `src` if it was already read.
+    Not cached, as all outputs of a source are rendered from one decode.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data) if data is not None else src)
+    img.load()
+    return img
+
+
+def open_draft(src: str, data: Optional[bytes], size: int) -> "Image.Image":
+    """Open `src` for outputs of up to `size`, decoding at a reduced scale if the format supports it."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data) if data is not None else src)
+    scale = size * low_memory_reducing_gap / min(img.width, img.height)
+    if scale < 1:
+        img.draft(None, (int(img.width * scale) + 1, int(img.height * scale) + 1))
+    img.load()
+    return img
+
+
+def image_bytes(img: "Image.Image") -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def scale_and_crop(img: "Image.Image", size: int, config: dict[str, Any]) -> "Image.Image":
+    from PIL import Image
 
-def scale_and_crop(img: Image, size: int, config: dict[str, Any]) -> Image:
     w, h = img.width, img.height
     scale = size / min(w, h)
-    img = img.resize((int(np.round(w*scale)), int(np.round(h*scale))), resample=Image.Resampling.LANCZOS)
+    rw, rh = int(round(w*scale)), int(round(h*scale))
 
-    w, h = img.width, img.height
-    img = np.array(img)
-    if w > h:
-        cw = (w - h) // 2
-        img = img[:, cw:cw+h]
-    elif h > w:
+    # Crop rectangle in the scaled image
+    left, top, right, bottom = 0, 0, rw, rh
+    if rw > rh:
+        left = (rw - rh) // 2
+        right = left + rh
+    elif rh > rw:
         h_crop = config.get("h_crop", "center")
         if h_crop == "top":
-            ch = 0
+            top = 0
         elif h_crop == "bottom":
-            ch = h-w
+            top = rh-rw
         else:
-            ch = (h - w) // 2
-        img = img[ch:ch+w]
+            top = (rh - rw) // 2
+        bottom = top + rw
+
+    # Resample only the kept region. Mapping the crop back with the full image's per-axis scale keeps
+    # every output pixel's filter window the same as resizing the whole image and cropping after.
+    # In low memory mode, the region is first reduced by an integer factor, so LANCZOS runs on a smaller image.
+    sx, sy = w / rw, h / rh
+    return img.resize(
+        (right - left, bottom - top),
+        resample=Image.Resampling.LANCZOS,
+        box=(left * sx, top * sy, right * sx, bottom * sy),
+        reducing_gap=low_memory_reducing_gap if config.get("low_memory") else None,
+    )
+
+
+def center_crop(img: "Image.Image", size: int) -> "Image.Image":
+    left = (img.width - size) // 2
+    top = (img.height - size) // 2
+    return img.crop((left, top, left + size, top + size))
+
+
+def process_image(src: str, dst: str, size: int, config: dict[str, Any]) -> dict[str, float]:
+    return process_image_renditions(src, [(dst, size)], config)
+
+
+def process_image_renditions(src: str, outputs: List[Tuple[str, int]], config: dict[str, Any]) -> dict[str, float]:
+    """
+    Decode `src` once and save it as every (dst, size) output. The source is scaled and cropped to
+    the largest size, and smaller sizes are downscaled from that instead of from the source.
+    With `"mode": "center_crop"` in config, the center is cropped without scaling instead.
+    Returns decode / resize / encode seconds, bytes read / written and memory use.
+    """
+    stats, encoded = render_image_renditions(src, outputs, config)
+    for (dst, _), content in zip(outputs, encoded):
+        with open(dst, "wb") as f:
+            f.write(content)
+    return stats
+
+
+def render_image_renditions(
+    src: str,
+    outputs: List[Tuple[str, int]],
+    config: dict[str, Any],
+    data: Optional[bytes] = None,
+) -> Tuple[dict[str, float], List[bytes]]:
+    """Like `process_image_renditions`, but returns the encoded outputs instead of writing them."""
+    from PIL import Image
+
+    max_size = max(size for _, size in outputs)
+    center_crop_mode = config.get("mode") == "center_crop"
+
+    start = time.perf_counter()
+    if config.get("low_memory") and not center_crop_mode:
+        img = open_draft(src, data, max_size)
+    else:
+        img = open_image(src, data)
+    decoded = time.perf_counter()
+    decoded_bytes = image_bytes(img)
+
+    base = center_crop(img, max_size) if center_crop_mode else scale_and_crop(img, max_size, config)
+    resized = {max_size: base}
+    for _, size in outputs:
+        if size not in resized:
+            resized[size] = base.resize((size, size), resample=Image.Resampling.LANCZOS)
+    scaled = time.perf_counter()
+
+    encoded = []
+    for dst, size in outputs:
+        buffer = io.BytesIO()
+        ext = os.path.splitext(dst)[1].lower()
+        resized[size].save(buffer, format=SAVE_FORMATS[ext], **SAVE_OPTIONS[ext])
+        encoded.append(buffer.getvalue())
+    done = time.perf_counter()
+
+    stats = {
+        "decode": decoded - start,
+        "resize": scaled - decoded,
+        "encode": done - scaled,
+        "bytes_read": len(data) if data is not None else os.path.getsize(src),
+        "bytes_written": sum(len(content) for content in encoded),
+        # Size of the decoded source, the largest buffer while processing an image
+        "decoded_bytes": decoded_bytes,
+        # Peak RSS of the process so far, the highest value is the peak of a worker
+        "max_rss": peak_rss()["self"],
+    }
+    return stats, encoded
+
+
+def dhash(file: str) -> int:
+    """64 bit difference hash, close for visually similar images."""
+    from PIL import Image
+
+    img = Image.open(file).convert("L").resize((9, 8), resample=Image.Resampling.LANCZOS)
+    pixels = list(img.getdata())
+    result = 0
+    for y in range(8):
+        for x in range(8):
+            result = (result << 1) | (pixels[y * 9 + x] > pixels[y * 9 + x + 1])
+    return result
+
+
+def pack_atlas(files: List[str], sheet_size: int) -> Tuple[List["Image.Image"], List[Tuple[int, int, int, int, int]]]:
+    """
+    Pack images into square `sheet_size` sheets row by row, in the given order.
+    Returns the sheets and a (sheet, x, y, w, h) rectangle for each file.
+    """
+    from PIL import Image
+
+    sheets = []
+    rects = []
+    x = y = row_height = 0
+    for file in files:
+        img = Image.open(file).convert("RGBA")
+        w, h = img.width, img.height
+        assert w <= sheet_size and h <= sheet_size, f"{file} does not fit in a {sheet_size} sheet"
 
-    return Image.fromarray(img)
+        if x + w > sheet_size:
+            x, y, row_height = 0, y + row_height, 0
+        if len(sheets) == 0 or y + h > sheet_size:
+            sheets.append(Image.new("RGBA", (sheet_size, sheet_size)))
+            x = y = row_height = 0
 
+        sheets[-1].paste(img, (x, y))
+        rects.append((len(sheets) - 1, x, y, w, h))
+        x += w
+        row_height = max(row_height, h)
 
-def process_image(src: str, dst: str, size: int, config: dict[str, Any]):
-    img = Image.open(src)
-    img = scale_and_crop(img, size, config)
-    img.save(dst, quality=95, method=6)
+    return sheets, rects
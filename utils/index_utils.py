@@ -0,0 +1,35 @@
+from bisect import bisect_left
+from pathlib import Path
+from typing import List, Optional
+
+
+class StemIndex:
+    """
+    Sorted index of file stems for exact and prefix lookups.
+    Results are returned in the order the files were given.
+    """
+
+    def __init__(self, files: List[Path]) -> None:
+        self.files = files
+        self.order = sorted(range(len(files)), key=lambda i: (files[i].stem, i))
+        self.stems = [files[i].stem for i in self.order]
+
+    def find(self, stem: str) -> Optional[Path]:
+        i = bisect_left(self.stems, stem)
+        if i < len(self.stems) and self.stems[i] == stem:
+            return self.files[self.order[i]]
+        return None
+
+    def with_prefix(self, prefix: str) -> List[Path]:
+        return [self.files[i] for i in self._prefix_positions(prefix)]
+
+    def with_prefixes(self, prefixes: List[str]) -> List[Path]:
+        positions = set()
+        for prefix in prefixes:
+            positions.update(self._prefix_positions(prefix))
+        return [self.files[i] for i in sorted(positions)]
+
+    def _prefix_positions(self, prefix: str) -> List[int]:
+        lo = bisect_left(self.stems, prefix)
+        hi = bisect_left(self.stems, prefix + chr(0x10ffff), lo)
+        return sorted(self.order[lo:hi])
@@ -1,5 +1,15 @@
 import json
 import os
+from dataclasses import fields
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from utils.file_utils import replace_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def read_json(file, default_func=None):
@@ -9,14 +19,56 @@ def read_json(file, default_func=None):
         return json.loads(f.read())
 
 
-def write_json(file, data):
-    os.makedirs(os.path.split(file)[0], exist_ok=True)
-    with open(file, "w", encoding="utf-8", newline="\n") as f:
-        f.write(json.dumps(data, indent=2, ensure_ascii=False, sort_keys=True))
+def write_json(file, data, minify=False) -> str:
+    """Write `data` unless the file already has the same content. Returns the content hash."""
+    def write(temp_file):
+        with open(temp_file, "w", encoding="utf-8", newline="\n") as f:
+            if minify:
+                json.dump(data, f, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+            else:
+                json.dump(data, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+    return replace_file(file, write)
+
+
+@lru_cache(maxsize=None)
+def field_names(cls) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+@lru_cache(maxsize=None)
+def omit_empty_fields(cls) -> Tuple[str, ...]:
+    """Fields with `omit_empty` metadata, left out of the output when empty (e.g. features that are off)."""
+    return tuple(f.name for f in fields(cls) if f.metadata.get("omit_empty", False))
+
+
+def to_dicts(cls, data: List[Any]) -> List[Dict[str, Any]]:
+    # Field values of the models are plain dicts / lists / strings, so they can be dumped as they are
+    names = field_names(cls)
+    omit_empty = omit_empty_fields(cls)
+    result = [{name: getattr(item, name) for name in names} for item in data]
+    if len(omit_empty) > 0:
+        for d in result:
+            for name in omit_empty:
+                if len(d[name]) == 0:
+                    del d[name]
+    return result
+
+
+def dumps_list(cls, data: List[Any]) -> bytes:
+    """Same bytes as json.dumps(..., indent=2, ensure_ascii=False, sort_keys=True) in UTF-8."""
+    items = to_dicts(cls, data)
+    if orjson is not None:
+        return orjson.dumps(items, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(items, indent=2, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+def write_list(cls, file, data) -> str:
+    """Write a list of `cls` unless the file already has the same content. Returns the content hash."""
+    content = dumps_list(cls, data)
 
+    def write(temp_file):
+        with open(temp_file, "wb") as f:
+            f.write(content)
 
-def write_list(cls, file, data):
-    os.makedirs(os.path.split(file)[0], exist_ok=True)
-    text = cls.schema().dumps(data, many=True, indent=2, ensure_ascii=False, sort_keys=True)
-    with open(file, "w", encoding="utf-8", newline="\n") as f:
-        f.write(text)
+    return replace_file(file, write)
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.file_utils import file_hash
+from utils.json_utils import read_json, write_json
+
+
+class HashCache:
+    """
+    Caches file hashes by stat signature (mtime_ns, size, inode), so files that did not change
+    are not read again.
+    """
+
+    def __init__(self, file: Path) -> None:
+        self.file = Path(file)
+        self.entries: Dict[str, List[Any]] = read_json(self.file, dict)
+        self.updated = False
+
+    def hash(self, file) -> str:
+        st = os.stat(file)
+        signature = [st.st_mtime_ns, st.st_size, st.st_ino]
+        key = os.path.abspath(file)
+        entry = self.entries.get(key)
+        if entry is not None and entry[:3] == signature:
+            return entry[3]
+
+        h = file_hash(file)
+        self.entries[key] = signature + [h]
+        self.updated = True
+        return h
+
+    def save(self):
+        if not self.updated:
+            return
+        write_json(self.file, self.entries)
+        self.updated = False
+
+
+class BuildManifest:
+    """
+    Records the inputs each output was built from, grouped by output section (e.g. "characters").
+    Paths are stored relative to the folder containing the manifest.
+    """
+
+    def __init__(self, file: Path) -> None:
+        self.file = Path(file)
+        self.root = self.file.parent
+        self.sections: Dict[str, Dict[str, Dict[str, Any]]] = read_json(self.file, dict)
+
+    def _key(self, dst) -> str:
+        return Path(dst).relative_to(self.root).as_posix()
+
+    def is_current(self, section: str, dst, record: Dict[str, Any]) -> bool:
+        entry = self.sections.get(section, {}).get(self._key(dst))
+        return entry == record and os.path.isfile(self.resolve(section, dst))
+
+    def alias(self, section: str, dst) -> Optional[Path]:
+        """The shared file an output was deduplicated into, if any."""
+        target = self.sections.get(f"{section}-aliases", {}).get(self._key(dst))
+        return self.root / target if target is not None else None
+
+    def outputs(self, section: str) -> List[Path]:
+        """Outputs recorded in a section."""
+        return [self.root / key for key in self.sections.get(section, {})]
+
+    def aliased(self, section: str) -> List[Path]:
+        """Outputs which were deduplicated into a shared file."""
+        return [self.root / key for key in self.sections.get(f"{section}-aliases", {})]
+
+    def set_alias(self, section: str, dst, target: Optional[Path]):
+        aliases = self.sections.setdefault(f"{section}-aliases", {})
+        if target is None:
+            aliases.pop(self._key(dst), None)
+        else:
+            aliases[self._key(dst)] = self._key(target)
+
+    def resolve(self, section: str, dst) -> Path:
+        """Where the content of an output is stored, which is the shared file for deduplicated outputs."""
+        target = self.alias(section, dst)
+        if target is not None and not os.path.isfile(dst):
+            return target
+        return Path(dst)
+
+    def update(self, section: str, dst, record: Dict[str, Any]):
+        self.sections.setdefault(section, {})[self._key(dst)] = record
+
+    def prune(self, section: str, keep: Iterable) -> List[Path]:
+        """Delete outputs of a section that are not in `keep` anymore, returns the removed files."""
+        entries = self.sections.get(section, {})
+        aliases = self.sections.get(f"{section}-aliases", {})
+        keep_keys = set(self._key(dst) for dst in keep)
+        removed = []
+        for key in sorted(set(entries.keys()) - keep_keys):
+            file = self.root / key
+            if file.is_file():
+                file.unlink()
+            removed.append(file)
+            del entries[key]
+            aliases.pop(key, None)
+        return removed
+
+    def save(self):
+        write_json(self.file, self.sections)
@@ -1,10 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List
 
-from dataclasses_json import dataclass_json
 
-
-@dataclass_json
 @dataclass
 class Character:
     id: str
@@ -12,9 +9,12 @@ class Character:
     short_names: Dict[str, str]
     images: List[str]
     searches: List[str]
+    # image name -> paths of all renditions, only filled when extra renditions are built
+    renditions: Dict[str, List[str]] = field(default_factory=dict, metadata={"omit_empty": True})
+    # image name -> shared image it was deduplicated into, only filled with --dedup
+    aliases: Dict[str, str] = field(default_factory=dict, metadata={"omit_empty": True})
 
 
-@dataclass_json
 @dataclass
 class FilterGroup:
     group_key: str
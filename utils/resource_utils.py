@@ -1,22 +1,107 @@
+import hashlib
+import json
 import logging
 import os
+import shutil
+import threading
+import time
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-
-from tqdm import tqdm
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from utils.cli_utils import create_common_parser
-from utils.image_utils import process_image
+from utils.file_utils import file_hash
+from utils.image_utils import (
+    WEBP_SAVE_OPTIONS,
+    dhash,
+    pack_atlas,
+    process_image_renditions,
+    render_image_renditions,
+    save_options,
+)
+from utils.compact_utils import compact_path, write_compact
 from utils.json_utils import read_json, write_json, write_list
 from utils.logging_utils import setup_logging
+from utils.manifest_utils import BuildManifest, HashCache
 from utils.models import Character, FilterGroup
+from utils.search_utils import build_search_index
+from utils.stats_utils import RunStats
+
+
+def process_image_task(src: str, outputs: List[Tuple[Path, int]], config: Dict[str, Any]) -> Dict[str, Any]:
+    for dst, _ in outputs:
+        os.makedirs(os.path.split(dst)[0], exist_ok=True)
+    return process_image_renditions(src, outputs, config)
+
+
+def render_image_task(
+    src: str, data: bytes, outputs: List[Tuple[Path, int]], config: Dict[str, Any]
+) -> Tuple[Dict[str, Any], List[bytes]]:
+    return render_image_renditions(src, [(str(dst), size) for dst, size in outputs], config, data)
+
+
+def init_worker(memory_limit: Optional[int]):
+    if memory_limit is not None:
+        import resource
+
+        # Address space, not RSS, so the limit has to leave room for the interpreter and libraries
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = memory_limit if hard == resource.RLIM_INFINITY else min(memory_limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def write_outputs(outputs: List[Tuple[Path, int]], encoded: List[bytes]):
+    for (dst, _), content in zip(outputs, encoded):
+        os.makedirs(os.path.split(dst)[0], exist_ok=True)
+        with open(dst, "wb") as f:
+            f.write(content)
+
+
+def image_record(src_hash: str, dst: Path, size: int, sizes: List[int], config: Dict[str, Any]) -> Dict[str, Any]:
+    record = {
+        "hash": src_hash,
+        "size": size,
+        "config": dict(config),
+        "encoder": save_options(str(dst)),
+    }
+    # Renditions are scaled from the largest size, so all sizes of the source affect the output
+    if len(sizes) > 1:
+        record["sizes"] = sizes
+    return record
+
+
+def build_manifest_path(out_root: Path):
+    return out_root / "build-manifest.json"
+
+
+def build_record_path(out_root: Path):
+    return out_root / "build-record.json"
+
+
+def hash_cache_path(out_root: Path):
+    # dot file, so it's not published with the Github page
+    return out_root / ".source-stats.json"
+
+
+# Bump when the sheet layout changes, so atlases are rebuilt
+atlas_layout_version = 2
+
+
+def atlas_json_path(out_root: Path, key: str):
+    return out_root / f"{key}-atlas.json"
 
 
 def char_json_path(out_root: Path):
     return out_root / "char.json"
 
 
+def search_json_path(out_root: Path):
+    return out_root / "search.json"
+
+
 def stamps_json_path(out_root: Path):
     return out_root / "stamps.json"
 
@@ -25,6 +110,13 @@ def filters_json_path(out_root: Path):
     return out_root / "filters.json"
 
 
+# Arguments which don't change the outputs, left out of build records
+runtime_args = {
+    "astgenne", "output", "cache", "report", "profile", "check",
+    "jobs", "readers", "writers", "queue_size", "worker_memory_mb",
+}
+
+
 class ResourceProcessor:
     def __init__(self, key: str) -> None:
         self.key = key
@@ -35,9 +127,20 @@ class ResourceProcessor:
         self.args = parser.parse_args()
         self.out_root = Path(self.args.output)
         self.res_root = Path(self.args.astgenne) / self.key
+        self.hash_cache = HashCache(hash_cache_path(self.out_root))
+        # stage name -> inputs of the last successful run of the stage
+        self.build_record: Dict[str, Any] = read_json(build_record_path(self.out_root), dict)
+        self.partial_run = False
+        self.stats = RunStats()
+        # content hashes of written metadata files, added to versions.json for per-file cache busting
+        self.file_hashes: Dict[str, str] = {}
+        # metadata files which were deleted, removed from versions.json
+        self.removed_files: Set[str] = set()
 
         if not os.path.isdir(self.args.astgenne):
             raise ValueError("Astgenne folder does not exist")
+        if self.args.worker_memory_mb is not None and os.name == "nt":
+            raise ValueError("--worker_memory_mb is not supported on Windows")
 
     def configure_parser(self, parser: ArgumentParser) -> ArgumentParser:
         return parser
@@ -51,23 +154,126 @@ class ResourceProcessor:
     def get_filters(self) -> List[FilterGroup]:
         raise NotImplementedError()
 
-    def main(self):
+    def get_stage_configs(self) -> Dict[str, List[Path]]:
+        """
+        Local config files read by each stage, part of the stage inputs compared by `--check`.
+        The "filters" configs are also inputs of "chars", which writes the search index.
+        """
+        return {}
+
+    def main(self, only_stages: Optional[List[str]] = None):
+        """
+        Run all enabled stages. With `only_stages`, only those stages run, and versions.json,
+        the build record and the run report (unless `--report` is given) are left as they are.
+        """
         args = self.args
-        if not args.skip_chars:
-            characters, avatar_paths, image_configs = self._process_chars()
+        self.partial_run = only_stages is not None
+        stages = [
+            name for name in self._enabled_stages()
+            if (only_stages is None or name in only_stages) and not self._is_up_to_date(name)
+        ]
+        if args.check and len(stages) == 0:
+            logging.info("All stages are up to date")
+            return
+
+        if "chars" in stages:
+            with self._stage("chars"):
+                characters, avatar_paths, image_configs = self._process_chars()
             if not args.skip_avatars:
-                self._process_avatars(characters, avatar_paths, image_configs)
-        if not args.skip_stamps:
-            self._process_stamps(self.get_stamps())
-        if not args.skip_filters:
-            self._process_filters()
-        self._process_versions()
+                with self._stage("avatars"):
+                    self._process_avatars(characters, avatar_paths, image_configs)
+                # Avatars are built from the same inputs, so they're recorded with the characters
+                self._record_stage("chars")
+        if "stamps" in stages:
+            with self._stage("stamps"):
+                self._process_stamps(self.get_stamps())
+            self._record_stage("stamps")
+        if "filters" in stages:
+            with self._stage("filters"):
+                self._process_filters()
+            self._record_stage("filters")
+        self._process_extra_stages(stages)
+        if self.partial_run:
+            if args.report is not None:
+                self._write_report()
+            return
+        with self._stage("versions"):
+            self._process_versions()
+        self._write_report()
+
+    def _enabled_stages(self) -> List[str]:
+        args = self.args
+        skipped = {"chars": args.skip_chars, "stamps": args.skip_stamps, "filters": args.skip_filters}
+        return [name for name, skip in skipped.items() if not skip]
+
+    def _process_extra_stages(self, stages: List[str]):
+        """Game specific stages, run after the common ones if they're in `stages`."""
+        pass
+
+    def _stage_inputs(self, name: str) -> Dict[str, Any]:
+        stage_configs = self.get_stage_configs()
+        configs = stage_configs.get(name, [])
+        if name == "chars":
+            # The search index written with the characters matches filter values as tags
+            configs = configs + [f for f in stage_configs.get("filters", []) if f not in configs]
+        inputs = {
+            # Local asset versions, and upstream versions of subclasses which download their data
+            "versions": {**ResourceProcessor._get_versions(self), **self._get_versions()},
+            "configs": {f"{Path(f).parent.name}/{Path(f).name}": self.hash_cache.hash(f) for f in configs},
+            "args": {k: v for k, v in vars(self.args).items() if k not in runtime_args and not k.startswith("skip_")},
+        }
+        self.hash_cache.save()
+        # Same types as the record read back from JSON
+        return json.loads(json.dumps(inputs, sort_keys=True, default=str))
+
+    def _is_up_to_date(self, name: str) -> bool:
+        if not self.args.check:
+            return False
+        if self.build_record.get(name) != self._stage_inputs(name):
+            return False
+        logging.info(f"Stage {name} is up to date")
+        return True
+
+    def _record_stage(self, name: str):
+        if self.partial_run:
+            return
+        # Inputs are read after the stage, as stages may update their configs (e.g. new translations)
+        self.build_record[name] = self._stage_inputs(name)
+        write_json(build_record_path(self.out_root), self.build_record)
+
+    def _stage(self, name: str):
+        profile_file = None
+        if self.args.profile == name:
+            profile_file = Path(self.args.cache) / f"{self.key}-{name}.pstats"
+        return self.stats.stage(name, profile_file)
+
+    def _write_report(self):
+        report_file = self.args.report or (Path(self.args.cache) / f"{self.key}-report.json")
+        write_json(report_file, self.stats.report())
+        logging.info(f"Wrote {report_file}")
 
     def _process_versions(self):
         all_vers = read_json(self.out_root.parent / "versions.json", dict)
         all_vers.update(self._get_versions())
+        all_vers.update(self.file_hashes)
+        for key in self.removed_files:
+            all_vers.pop(key, None)
         write_json(self.out_root.parent / "versions.json", all_vers)
 
+    def _file_hash_key(self, file: Path) -> str:
+        # keyed by the path relative to versions.json, e.g. "ak/char.json"
+        return Path(file).relative_to(self.out_root.parent).as_posix()
+
+    def _add_file_hash(self, file: Path, content_hash: str):
+        key = self._file_hash_key(file)
+        self.file_hashes[key] = content_hash[:16]
+        self.removed_files.discard(key)
+
+    def _remove_file_hash(self, file: Path):
+        key = self._file_hash_key(file)
+        self.file_hashes.pop(key, None)
+        self.removed_files.add(key)
+
     def _get_versions(self) -> Dict[str, str]:
         res_vers = read_json(self.res_root.parent / "versions.json", None)
         return {
@@ -77,59 +283,337 @@ class ResourceProcessor:
     def _process_chars(self) -> Tuple[List[Character], Dict[str, Path]]:
         out_root = self.out_root
 
-        data_file = char_json_path(out_root)
-
         characters, avatar_paths, image_configs = self.get_chars()
-        write_list(Character, data_file, characters)
-        logging.info(f"Wrote {data_file}")
+        if len(self._avatar_outputs("")) > 1:
+            for ch in characters:
+                ch.renditions = {
+                    img: [dst.relative_to(out_root).as_posix() for dst, _ in self._avatar_outputs(img)]
+                    for img in ch.images
+                }
+        if self.args.skip_avatars:
+            # Otherwise written once the avatars are built, so it has their aliases
+            self._apply_aliases(characters)
+            self._write_chars(characters)
+        self._write_search_index(characters)
 
         return characters, avatar_paths, image_configs
 
-    def _process_avatars(self, characters: List[Character], image_paths: Dict[str, Path], image_configs: Dict[str, Dict[str, Any]]):
+    def _write_search_index(self, characters: List[Character]):
+        # Filter values are matched as tags, not as text
+        tags = set(search for gp in self.get_filters() for search in gp.filter_searches)
+        index_file = search_json_path(self.out_root)
+        self._add_file_hash(index_file, write_json(index_file, build_search_index(characters, tags), minify=True))
+        logging.info(f"Wrote {index_file}")
+
+    def _write_chars(self, characters: List[Character]):
+        self._write_list(Character, char_json_path(self.out_root), characters)
+
+    def _apply_aliases(self, characters: List[Character]):
+        """Point avatars deduplicated by `--dedup` at their shared image, as recorded in the build manifest."""
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+        out_images = self.out_root / "characters"
+        for ch in characters:
+            ch.aliases = {}
+            for img in ch.images:
+                shared = manifest.alias("characters", out_images / f"{img}.webp")
+                if shared is None:
+                    continue
+                ch.aliases[img] = shared.relative_to(out_images).with_suffix("").as_posix()
+                # Only the default rendition is deduplicated, and its own file is deleted
+                if img in ch.renditions:
+                    ch.renditions[img][0] = shared.relative_to(self.out_root).as_posix()
+
+    def _write_list(self, cls, file: Path, data: List[Any]):
+        self._add_file_hash(file, write_list(cls, file, data))
+        logging.info(f"Wrote {file}")
+        if self.args.compact:
+            self._add_file_hash(compact_path(file), write_compact(cls, compact_path(file), data))
+            logging.info(f"Wrote {compact_path(file)}")
+
+    def _avatar_outputs(self, img: str) -> List[Tuple[Path, int]]:
+        """All renditions of an avatar, starting with the default `--avatar_size` WebP."""
         out_images = self.out_root / "characters"
+        formats = ["webp", "avif"] if self.args.avatar_avif else ["webp"]
+        outputs = [(out_images / f"{img}.{fmt}", self.args.avatar_size) for fmt in formats]
+        for size in sorted(set(self.args.avatar_renditions) - {self.args.avatar_size}):
+            outputs += [(out_images / f"{size}/{img}.{fmt}", size) for fmt in formats]
+        return outputs
+
+    def _process_avatars(self, characters: List[Character], image_paths: Dict[str, Path], image_configs: Dict[str, Dict[str, Any]]):
         src_files = [image_paths[img] for ch in characters for img in ch.images]
-        dst_files = [out_images / f"{img}.webp" for ch in characters for img in ch.images]
+        outputs = [self._avatar_outputs(img) for ch in characters for img in ch.images]
+        dst_files = [o[0][0] for o in outputs]
 
-        self._process_image_list(
+        if not self.args.dedup:
+            self._restore_deduplicated("characters")
+        records = self._process_image_list(
+            "characters",
             src_files,
-            dst_files,
-            self.args.avatar_size,
+            outputs,
             image_configs,
         )
+        if self.args.atlas:
+            self._process_atlas("characters", [img for ch in characters for img in ch.images], dst_files, records)
+        else:
+            self._remove_atlas("characters")
+        if self.args.dedup:
+            self._dedup_images("characters", [img for ch in characters for img in ch.images], dst_files)
+        self._apply_aliases(characters)
+        self._write_chars(characters)
 
     def _process_stamps(self, stamp_files: List[str]):
         out_stamps = self.out_root / "stamps"
 
         names = [os.path.splitext(os.path.split(f)[1])[0] for f in stamp_files]
-        self._process_image_list(
+        dst_files = [out_stamps / f"{name}.webp" for name in names]
+        records = self._process_image_list(
+            "stamps",
             stamp_files,
-            [out_stamps / f"{name}.webp" for name in names],
-            self.args.stamp_size,
+            [[(dst, self.args.stamp_size)] for dst in dst_files],
         )
-
-        write_json(stamps_json_path(self.out_root), names)
-
-    def _process_image_list(self, src_files: List[str], dst_files: List[str], size: int, image_configs=None):
+        if self.args.atlas:
+            self._process_atlas("stamps", names, dst_files, records)
+        else:
+            self._remove_atlas("stamps")
+
+        self._add_file_hash(stamps_json_path(self.out_root), write_json(stamps_json_path(self.out_root), names))
+
+    def _process_image_list(self, key: str, src_files: List[str], outputs: List[List[Tuple[Path, int]]], image_configs=None):
+        """
+        Process each source into its list of (dst, size) outputs, skipping sources whose outputs are
+        up to date in the build manifest. Returns the manifest record of every output.
+        Outputs of the same source (e.g. aliases of one image) are grouped, so each source is decoded once.
+        """
         image_configs = image_configs or {}
-        all_files = list(zip(src_files, dst_files))
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+
+        # (src, config) -> {dst: size}
+        groups: Dict[Tuple[str, str], Dict[Path, int]] = {}
+        records = {}
+        for src, src_outputs in zip(src_files, outputs):
+            config = image_configs.get(str(src), {})
+            if self.args.low_memory:
+                # Part of the records, the reduced decode gives slightly different pixels
+                config = {**config, "low_memory": True}
+            src_hash = self.hash_cache.hash(src)
+            sizes = sorted(set(size for _, size in src_outputs))
+            group = groups.setdefault((str(src), json.dumps(config, sort_keys=True)), {})
+            for dst, size in src_outputs:
+                group[dst] = size
+                records[str(dst)] = image_record(src_hash, dst, size, sizes, config)
+        self.hash_cache.save()
+
+        tasks = [
+            (src, list(group.items()), json.loads(config)) for (src, config), group in groups.items()
+        ]
         pending = [
-            f for f in all_files if not os.path.isfile(f[1])
+            task for task in tasks
+            if not all(manifest.is_current(key, dst, records[str(dst)]) for dst, _ in task[1])
         ]
 
-        logging.info(f"Process {len(pending)} of {len(all_files)} images")
-        if len(pending) == 0:
+        removed = manifest.prune(key, records.keys())
+        if len(removed) > 0:
+            logging.info(f"Removed {len(removed)} stale images")
+
+        logging.info(f"Process {len(pending)} of {len(tasks)} source images ({len(records)} outputs)")
+        try:
+            for task in self._run_image_tasks(pending):
+                for dst, _ in task[1]:
+                    manifest.update(key, dst, records[str(dst)])
+        finally:
+            manifest.save()
+
+        return records
+
+    def _process_atlas(self, key: str, names: List[str], files: List[str], records: Dict[str, Dict[str, Any]]):
+        """Pack processed images into sheets under atlas/, with an index of image name to sheet rectangle."""
+        index_file = atlas_json_path(self.out_root, key)
+        unique = dict(zip(names, files))
+        sheet_size = self.args.atlas_size
+
+        # The atlas only depends on the records of the packed images
+        inputs = [[name, records[str(file)]] for name, file in unique.items()]
+        record = {
+            "inputs": hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest(),
+            "sheet_size": sheet_size,
+            "layout": atlas_layout_version,
+        }
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+        if manifest.is_current(f"{key}-atlas", index_file, record) and all(
+            manifest.is_current(f"{key}-atlas-sheets", sheet_file, record)
+            for sheet_file in manifest.outputs(f"{key}-atlas-sheets")
+        ):
+            logging.info(f"Atlas {key} is up to date")
+            return
+
+        logging.info(f"Pack {len(unique)} images into {key} atlas")
+        sheets, rects = pack_atlas([manifest.resolve(key, file) for file in unique.values()], sheet_size)
+        sheet_files = [self.out_root / f"atlas/{key}-{i}.webp" for i in range(len(sheets))]
+        os.makedirs(self.out_root / "atlas", exist_ok=True)
+        for sheet, sheet_file in zip(sheets, sheet_files):
+            sheet.save(sheet_file, **WEBP_SAVE_OPTIONS)
+
+        content_hash = write_json(index_file, {
+            "sheets": [f.relative_to(self.out_root).as_posix() for f in sheet_files],
+            "images": {name: list(rect) for name, rect in zip(unique.keys(), rects)},
+        })
+        self._add_file_hash(index_file, content_hash)
+        logging.info(f"Wrote {index_file}")
+
+        for sheet_file in sheet_files:
+            manifest.update(f"{key}-atlas-sheets", sheet_file, record)
+        manifest.prune(f"{key}-atlas-sheets", sheet_files)
+        manifest.update(f"{key}-atlas", index_file, record)
+        manifest.save()
+
+    def _remove_atlas(self, key: str):
+        """Delete the atlas of an earlier `--atlas` run."""
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+        removed = manifest.prune(f"{key}-atlas-sheets", []) + manifest.prune(f"{key}-atlas", [])
+        if len(removed) == 0:
+            return
+
+        self._remove_file_hash(atlas_json_path(self.out_root, key))
+        atlas_dir = self.out_root / "atlas"
+        if atlas_dir.is_dir() and not any(atlas_dir.iterdir()):
+            atlas_dir.rmdir()
+        manifest.save()
+        logging.info(f"Removed {key} atlas")
+
+    def _dedup_images(self, key: str, names: List[str], files: List[Path]):
+        """
+        Move processed images with identical content (or close perceptual hashes with `--dedup_phash`) to
+        <key>/shared/<content hash>.webp, so they're stored once. The build manifest remembers where each
+        output went, so deduplicated outputs are not rebuilt, and is where the aliases are read from.
+        """
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+        shared_dir = self.out_root / key / "shared"
+        unique = dict(zip(names, files))
+        max_distance = self.args.dedup_phash
+
+        # content hash -> names, the first name of a group is the one compared with perceptual hashes
+        groups: Dict[str, List[str]] = {}
+        phashes: Dict[str, int] = {}
+        for name, file in unique.items():
+            file = manifest.resolve(key, file)
+            content_hash = file_hash(file)
+            if content_hash not in groups and max_distance is not None:
+                phashes[name] = dhash(file)
+                content_hash = next(
+                    (h for h, group in groups.items() if bin(phashes[group[0]] ^ phashes[name]).count("1") <= max_distance),
+                    content_hash,
+                )
+            groups.setdefault(content_hash, []).append(name)
+
+        aliased = 0
+        shared_files = set()
+        for content_hash, group in groups.items():
+            if len(group) == 1:
+                # Restore images which are no longer duplicates
+                file = unique[group[0]]
+                if not file.is_file():
+                    shutil.copyfile(manifest.resolve(key, file), file)
+                manifest.set_alias(key, file, None)
+                continue
+
+            shared = shared_dir / f"{content_hash[:16]}.webp"
+            if not shared.is_file():
+                os.makedirs(shared_dir, exist_ok=True)
+                shutil.copyfile(manifest.resolve(key, unique[group[0]]), shared)
+            shared_files.add(shared)
+            for name in group:
+                manifest.set_alias(key, unique[name], shared)
+                if unique[name].is_file():
+                    unique[name].unlink()
+                aliased += 1
+
+        if shared_dir.is_dir():
+            for file in shared_dir.glob("*.webp"):
+                if file not in shared_files:
+                    file.unlink()
+        manifest.save()
+
+        logging.info(f"Deduplicated {aliased} images into {len(shared_files)} shared images")
+
+    def _restore_deduplicated(self, key: str):
+        """Copy images deduplicated by an earlier `--dedup` run back to their own files."""
+        manifest = BuildManifest(build_manifest_path(self.out_root))
+        aliased = manifest.aliased(key)
+        if len(aliased) == 0:
+            return
+
+        for dst in aliased:
+            shared = manifest.alias(key, dst)
+            # Outputs without a shared file are rebuilt, as they're no longer current
+            if not dst.is_file() and shared.is_file():
+                shutil.copyfile(shared, dst)
+            manifest.set_alias(key, dst, None)
+        shutil.rmtree(self.out_root / key / "shared", ignore_errors=True)
+        manifest.save()
+        logging.info(f"Restored {len(aliased)} deduplicated images")
+
+    def _run_image_tasks(self, tasks: List[Tuple[str, List[Tuple[Path, int]], Dict[str, Any]]]):
+        """Process image tasks, yielding each task in order once it's done. Raises on the first failure."""
+        if len(tasks) == 0:
+            return
+
+        from tqdm import tqdm
+        if self.args.jobs <= 1:
+            for task in tqdm(tasks):
+                try:
+                    self.stats.add_image(task[0], process_image_task(*task))
+                except:
+                    logging.error(f"Failed: {task[0]} -> {task[1][0][0]}")
+                    raise
+                yield task
             return
 
-        for src, dst in tqdm(pending):
-            try:
-                os.makedirs(os.path.split(dst)[0], exist_ok=True)
-                process_image(src, dst, size, image_configs.get(str(src), {}))
-            except:
-                logging.error(f"Failed: {src} -> {dst}")
-                raise
+        # Staged pipeline: reader threads prefetch sources, worker processes decode / resize / encode them,
+        # and writer threads save the outputs, so disk reads and writes overlap with the CPU work.
+        # At most `queue_size` tasks are in flight, so readers wait for the workers instead of holding
+        # every source in memory.
+        queue_size = self.args.queue_size or 2 * self.args.jobs + self.args.readers
+        read_slots = threading.Semaphore(self.args.readers)
+        write_slots = threading.Semaphore(self.args.writers)
+
+        memory_limit = self.args.worker_memory_mb << 20 if self.args.worker_memory_mb is not None else None
+        workers = ProcessPoolExecutor(max_workers=self.args.jobs, initializer=init_worker, initargs=(memory_limit,))
+        with workers, ThreadPoolExecutor(max_workers=queue_size) as stages:
+            def run(task):
+                src, outputs, config = task
+                start = time.perf_counter()
+                with read_slots:
+                    data = Path(src).read_bytes()
+                read = time.perf_counter() - start
+
+                image_stats, encoded = workers.submit(render_image_task, src, data, outputs, config).result()
+                del data
+
+                start = time.perf_counter()
+                with write_slots:
+                    write_outputs(outputs, encoded)
+                return {**image_stats, "read": read, "write": time.perf_counter() - start}
+
+            remaining = iter(tasks)
+            in_flight = deque((task, stages.submit(run, task)) for task in islice(remaining, queue_size))
+            # Results are collected in submission order, so progress and errors are reported as in the serial path
+            with tqdm(total=len(tasks)) as progress:
+                while len(in_flight) > 0:
+                    task, future = in_flight.popleft()
+                    try:
+                        self.stats.add_image(task[0], future.result())
+                    except:
+                        logging.error(f"Failed: {task[0]} -> {task[1][0][0]}")
+                        for _, pending in in_flight:
+                            pending.cancel()
+                        workers.shutdown(wait=True, cancel_futures=True)
+                        raise
+                    in_flight.extend((task, stages.submit(run, task)) for task in islice(remaining, 1))
+                    progress.update()
+                    yield task
 
     def _process_filters(self):
         logging.info("Get filters")
         filters = self.get_filters()
         logging.info(f"Save {len(filters)} filters")
-        write_list(FilterGroup, filters_json_path(self.out_root), filters)
+        self._write_list(FilterGroup, filters_json_path(self.out_root), filters)
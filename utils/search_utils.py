@@ -0,0 +1,87 @@
+import base64
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set
+
+from utils.models import Character
+
+# Bump when the index layout or normalization changes, clients check it before using the index
+search_index_version = 2
+max_prefix = 4
+
+_separators = re.compile(r"[\s\-_.,:;'\"()\[\]\u00b7\u30fb=]+")
+_kana = re.compile(r"[\u3040-\u30ff]")
+_hiragana = re.compile(r"^[\u3040-\u309f\u30fc]+$")
+_katakana = re.compile(r"[\u30a1-\u30f6]")
+
+
+def normalize(text: str) -> str:
+    """Fold full / half width forms, case and katakana to hiragana. Clients normalize queries the same way."""
+    return to_hiragana(unicodedata.normalize("NFKC", text).casefold())
+
+
+def to_hiragana(text: str) -> str:
+    return _katakana.sub(lambda m: chr(ord(m.group(0)) - 0x60), text)
+
+
+def tokens(text: str) -> Set[str]:
+    """Words of `text` and the text without separators, with romaji for kana and kana for romaji."""
+    import romkan
+
+    text = normalize(text)
+    words = [w for w in _separators.split(text) if len(w) > 0]
+    result = set(words)
+    if len(words) > 1:
+        result.add("".join(words))
+
+    for word in list(result):
+        if _kana.search(word) is not None:
+            result.add(romkan.to_roma(word))
+        elif word.isascii() and word.isalpha():
+            # Only words that are valid romaji, e.g. "amiya" but not "texas"
+            kana = romkan.to_hiragana(word)
+            if _hiragana.match(kana) is not None:
+                result.add(kana)
+    return result
+
+
+def prefixes(token: str) -> Iterable[str]:
+    return (token[:n] for n in range(1, min(len(token), max_prefix) + 1))
+
+
+def bitset(indices: Iterable[int]) -> str:
+    """Base64 of a little endian bitset, bit i is set for each index i."""
+    value = 0
+    for i in indices:
+        value |= 1 << i
+    return base64.b64encode(value.to_bytes((value.bit_length() + 7) // 8, "little")).decode("ascii")
+
+
+def build_search_index(characters: List[Character], tags: Set[str]) -> Dict[str, Any]:
+    """
+    Map prefixes (up to `max_prefix` characters) of the normalized names and searches of each character to
+    character indices in char.json. Searches in `tags` (filter values, e.g. ":#type-enemy") are stored as
+    bitsets instead. Longer queries are matched by their first `max_prefix` characters and checked by the client.
+    """
+    grams: Dict[str, Set[int]] = defaultdict(set)
+    tag_indices: Dict[str, List[int]] = defaultdict(list)
+    for i, ch in enumerate(characters):
+        texts = list(ch.names.values()) + list(ch.short_names.values())
+        for search in ch.searches:
+            if search in tags:
+                tag_indices[search].append(i)
+            else:
+                texts.append(search)
+
+        for token in set().union(*[tokens(text) for text in texts if text]):
+            for prefix in prefixes(token):
+                grams[prefix].add(i)
+
+    return {
+        "version": search_index_version,
+        "max_prefix": max_prefix,
+        "ids": [ch.id for ch in characters],
+        "grams": {gram: sorted(indices) for gram, indices in grams.items()},
+        "tags": {tag: bitset(indices) for tag, indices in tag_indices.items()},
+    }
@@ -0,0 +1,110 @@
+import cProfile
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def cpu_time() -> float:
+    """CPU time of this process and its finished child processes (e.g. image workers)."""
+    if resource is None:
+        return time.process_time()
+    total = 0.0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def peak_rss() -> Dict[str, Optional[int]]:
+    """Peak resident set size in bytes of this process and of its largest child process."""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def percentiles(values: List[float], points=(50, 90, 99)) -> Dict[str, float]:
+    if len(values) == 0:
+        return {}
+    values = sorted(values)
+    result = {f"p{p}": values[min(len(values) - 1, len(values) * p // 100)] for p in points}
+    result["max"] = values[-1]
+    result["total"] = sum(values)
+    return result
+
+
+class RunStats:
+    """Collects stage and per-image timings of a run for the JSON run report."""
+
+    # read / write are only timed separately by the pipelined (-j > 1) image processing
+    image_phases = ["read", "decode", "resize", "encode", "write"]
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.images: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str, profile_file: Optional[str] = None):
+        profiler = cProfile.Profile() if profile_file is not None else None
+        wall, cpu = time.perf_counter(), cpu_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(os.path.split(profile_file)[0], exist_ok=True)
+                profiler.dump_stats(profile_file)
+                logging.info(f"Wrote profile of {name} to {profile_file}")
+            self.stages[name] = {
+                "wall": time.perf_counter() - wall,
+                "cpu": cpu_time() - cpu,
+            }
+            logging.info(f"Stage {name}: {self.stages[name]['wall']:.2f}s")
+
+    def add_image(self, src: str, image_stats: Dict[str, Any]):
+        self.images.append({"src": str(src), **image_stats})
+
+    def report(self) -> Dict[str, Any]:
+        folders = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        for img in self.images:
+            folder = folders[os.path.split(img["src"])[0]]
+            folder["count"] += 1
+            folder["seconds"] += sum(img.get(phase, 0.0) for phase in self.image_phases)
+
+        return {
+            "stages": self.stages,
+            "images": {
+                "count": len(self.images),
+                **{phase: percentiles([img[phase] for img in self.images if phase in img]) for phase in self.image_phases},
+                "bytes_read": sum(img["bytes_read"] for img in self.images),
+                "bytes_written": sum(img["bytes_written"] for img in self.images),
+                "folders": dict(sorted(folders.items(), key=lambda pair: -pair[1]["seconds"])),
+                "memory": self._memory_report(),
+            },
+            "peak_rss": peak_rss(),
+        }
+
+    def _memory_report(self) -> Dict[str, Any]:
+        images = [img for img in self.images if "decoded_bytes" in img]
+        largest = sorted(images, key=lambda img: -img["decoded_bytes"])[:10]
+        return {
+            "decoded_bytes": percentiles([img["decoded_bytes"] for img in images]),
+            "worker_peak_rss": max((img["max_rss"] for img in images if img["max_rss"] is not None), default=None),
+            "largest": [{"src": img["src"], "decoded_bytes": img["decoded_bytes"]} for img in largest],
+        }
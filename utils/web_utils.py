@@ -1,25 +1,189 @@
+import hashlib
+import logging
 import os
-from typing import Any, Dict, List, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
-import requests
+from utils.json_utils import read_json, write_json
 
+if TYPE_CHECKING:
+    import requests
 
-def get_resp(url: str) -> requests.Response:
-    req = requests.Request("GET", url).prepare()
+max_connections = 8
+timeout = 30
+max_retries = 3
+retry_backoff = 1.0
+chunk_size = 1 << 20
+
+
+class DownloadStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, num_bytes: int, seconds: float):
+        with self.lock:
+            self.files += 1
+            self.bytes += num_bytes
+            self.seconds += seconds
+
+    def __str__(self) -> str:
+        speed = self.bytes / self.seconds / 1e6 if self.seconds > 0 else 0
+        return f"{self.files} files, {self.bytes / 1e6:.1f} MB in {self.seconds:.1f}s ({speed:.1f} MB/s)"
+
+
+download_stats = DownloadStats()
+
+
+@lru_cache(maxsize=None)
+def get_session() -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # Shared by all requests, so connections to the same host are reused
     s = requests.Session()
-    resp = s.send(req)
+    adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def request(url: str, headers: Optional[Dict[str, str]] = None, stream=False) -> "requests.Response":
+    """GET with timeout, retrying connection errors and server errors with exponential backoff."""
+    import requests
+
+    for attempt in range(max_retries + 1):
+        try:
+            resp = get_session().get(url, headers=headers, timeout=timeout, stream=stream)
+            if resp.status_code < 500 or attempt == max_retries:
+                return resp
+            logging.warning(f"Error {resp.status_code}: {url}")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            logging.warning(f"{type(e).__name__}: {url}")
+        time.sleep(retry_backoff * 2 ** attempt)
+
+
+def get_resp(url: str, headers: Optional[Dict[str, str]] = None) -> "requests.Response":
+    resp = request(url, headers)
     assert resp.status_code == 200, f"Error: {resp.status_code}"
     return resp
 
 
-def download_json(url: str) -> Union[List[Any], Dict[str, Any]]:
-    return get_resp(url).json()
+def stream_to_file(resp: "requests.Response", file: Path, append=False):
+    start = time.perf_counter()
+    num_bytes = 0
+    with open(file, "ab" if append else "wb") as f:
+        for chunk in resp.iter_content(chunk_size):
+            f.write(chunk)
+            num_bytes += len(chunk)
+    download_stats.add(num_bytes, time.perf_counter() - start)
+
+
+def download_json(url: str, cache_dir: Optional[Path] = None) -> Union[List[Any], Dict[str, Any]]:
+    if cache_dir is None:
+        return get_resp(url).json()
+
+    # Revalidate cached responses with ETag / Last-Modified, unchanged data comes back as 304
+    base = Path(cache_dir) / hashlib.sha1(url.encode("utf-8")).hexdigest()
+    data_file = base.with_suffix(".json")
+    meta_file = base.with_suffix(".meta.json")
+    meta = read_json(meta_file, dict) if data_file.is_file() else {}
+
+    headers = {}
+    if "etag" in meta:
+        headers["If-None-Match"] = meta["etag"]
+    if "last_modified" in meta:
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    resp = request(url, headers, stream=True)
+    if resp.status_code == 304:
+        resp.close()
+        return read_json(data_file)
+    assert resp.status_code == 200, f"Error: {resp.status_code}"
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_file = base.with_suffix(".json.part")
+    stream_to_file(resp, temp_file)
+    os.replace(temp_file, data_file)
+    meta = {"url": url}
+    if "ETag" in resp.headers:
+        meta["etag"] = resp.headers["ETag"]
+    if "Last-Modified" in resp.headers:
+        meta["last_modified"] = resp.headers["Last-Modified"]
+    write_json(meta_file, meta)
+    return read_json(data_file)
+
+
+def download_json_all(urls: List[str], cache_dir: Optional[Path] = None) -> List[Union[List[Any], Dict[str, Any]]]:
+    if len(urls) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(urls), max_connections)) as pool:
+        return list(pool.map(lambda url: download_json(url, cache_dir), urls))
 
 
 def download_file(url: str, file: str) -> None:
+    """
+    Stream `url` into `file` through a temporary ".part" file, which is renamed into place when complete.
+    Interrupted downloads are resumed with Range requests, validated with If-Range by the ETag or
+    Last-Modified of the first response, so a changed resource is downloaded again instead of appended.
+    """
+    import requests
+
     base = os.path.split(file)[0]
     os.makedirs(base, exist_ok=True)
 
-    resp = get_resp(url)
-    with open(file, "wb") as f:
-        f.write(resp.content)
+    temp_file = Path(f"{file}.part")
+    meta_file = Path(f"{file}.part.json")
+    for attempt in range(max_retries + 1):
+        meta = read_json(meta_file, dict) if temp_file.is_file() else {}
+        validator = meta.get("etag") or meta.get("last_modified")
+        if temp_file.is_file() and (meta.get("url") != url or validator is None):
+            # Can't tell if the partial file is from the same version of the resource
+            temp_file.unlink()
+        offset = temp_file.stat().st_size if temp_file.is_file() else 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset > 0 else None
+        try:
+            with request(url, headers, stream=True) as resp:
+                if resp.status_code == 416:
+                    # The partial file is complete only if its size matches the resource
+                    if resp.headers.get("Content-Range", "").endswith(f"/{offset}"):
+                        break
+                    logging.warning(f"Partial file does not match: {url}, download again")
+                    temp_file.unlink()
+                    continue
+                assert resp.status_code in [200, 206], f"Error: {resp.status_code}"
+
+                resumed = resp.status_code == 206
+                if resumed and not resp.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                    logging.warning(f"Unexpected range {resp.headers.get('Content-Range')}: {url}, download again")
+                    temp_file.unlink()
+                    continue
+                if not resumed:
+                    # Full response, because of a new download, a changed resource or no range support
+                    meta = {"url": url}
+                    if "ETag" in resp.headers:
+                        meta["etag"] = resp.headers["ETag"]
+                    if "Last-Modified" in resp.headers:
+                        meta["last_modified"] = resp.headers["Last-Modified"]
+                    write_json(meta_file, meta)
+                stream_to_file(resp, temp_file, append=resumed)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_retries:
+                raise
+            logging.warning(f"{type(e).__name__}: {url}, resume from {temp_file.stat().st_size if temp_file.is_file() else 0}")
+            time.sleep(retry_backoff * 2 ** attempt)
+    else:
+        raise RuntimeError(f"Failed to download {url}")
+
+    os.replace(temp_file, file)
+    if meta_file.is_file():
+        meta_file.unlink()